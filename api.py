@@ -0,0 +1,404 @@
+from datetime import date, datetime
+from functools import wraps
+
+from flask import Blueprint, jsonify, request
+from flask_login import current_user
+from sqlalchemy import delete, insert, or_, select, union, update
+from sqlalchemy.exc import IntegrityError
+
+from audit import audit_event, record_audit
+from checkouts import MAX_BULK_ITEMS, check_in_many, check_out_many
+from facets import invalidate_facets
+from history import describe_changes, item_diff
+from models import db, Inventory, ChangeLog, Checkout, Loan, User
+from pagination import keyset_paginate
+from queries import inventory_filters, filtered_inventory_query, inventory_sort_keys
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_SIZE = 5000
+
+# Writable Inventory fields and the JSON types they accept
+TEXT_FIELDS = (
+    'site_name', 'room_number', 'room_name', 'asset_tag', 'asset_type', 'model',
+    'serial_number', 'category', 'notes', 'assigned_to',
+)
+DATE_FIELDS = ('date_assigned', 'date_decommissioned')
+REQUIRED_FIELDS = ('site_name', 'asset_tag', 'asset_type')
+
+
+def api_error(message, status, **details):
+    return jsonify(error=message, **details), status
+
+
+def token_user(request):
+    """The user whose API token comes as `Authorization: Bearer <token>`, or None.
+
+    Registered as the app's flask_login request loader for API requests, so
+    scripts authenticate without a session cookie.
+    """
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    return User.query.filter_by(api_token_hash=User.hash_api_token(token.strip())).first()
+
+
+def api_login_required(view):
+    """Like flask_login.login_required, but answers 401 JSON instead of redirecting."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not current_user.is_authenticated:
+            response, status = api_error("Authentication required: log in or send an API token", 401)
+            response.headers['WWW-Authenticate'] = 'Bearer'
+            return response, status
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def can_edit():
+    return current_user.is_admin() or current_user.is_editor()
+
+
+def item_to_dict(item):
+    data = {}
+    for column in Inventory.__table__.columns:
+        value = getattr(item, column.key)
+        data[column.key] = value.isoformat() if isinstance(value, (date, datetime)) else value
+    return data
+
+
+def conditional_json(payload):
+    """JSON response with an ETag; answers 304 when it matches If-None-Match."""
+    response = jsonify(payload)
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def parse_item(data, partial=False):
+    """Validates one JSON item, returns (column values, error messages)."""
+    if not isinstance(data, dict):
+        return {}, ["item must be an object"]
+
+    values = {}
+    errors = []
+    for key, value in data.items():
+        if key == 'id' and partial:
+            continue
+        if key in TEXT_FIELDS:
+            if value is not None and not isinstance(value, str):
+                errors.append(f"{key} must be a string")
+            else:
+                values[key] = value.strip() if isinstance(value, str) else None
+        elif key in DATE_FIELDS:
+            try:
+                values[key] = date.fromisoformat(value) if value else None
+            except (TypeError, ValueError):
+                errors.append(f"{key} must be a YYYY-MM-DD date")
+        elif key == 'is_loaner':
+            if not isinstance(value, bool):
+                errors.append("is_loaner must be true or false")
+            else:
+                values[key] = value
+        else:
+            errors.append(f"unknown field {key}")
+
+    for key in REQUIRED_FIELDS:
+        if (key in values or not partial) and not values.get(key):
+            errors.append(f"{key} is required")
+    return values, errors
+
+
+def batch_payload(key):
+    """Returns the list under `key` in the JSON body, or an error response."""
+    payload = request.get_json(silent=True)
+    records = payload.get(key) if isinstance(payload, dict) else None
+    if not isinstance(records, list) or not records:
+        return None, api_error(f"Request body must be a JSON object with a non-empty '{key}' list", 400)
+    if len(records) > MAX_BATCH_SIZE:
+        return None, api_error(f"At most {MAX_BATCH_SIZE} {key} per request", 413)
+    return records, None
+
+
+def find_conflicts(rows, ids=None):
+    """Errors for asset tags/serials duplicated in the batch or owned by other items.
+
+    `ids` gives each row's own item id when updating. Uses one query per
+    unique column, whatever the batch size.
+    """
+    errors = {}
+    ids = ids or [None] * len(rows)
+    for field in ('asset_tag', 'serial_number'):
+        column = getattr(Inventory, field)
+        claimed = {}
+        for index, values in enumerate(rows):
+            value = values.get(field)
+            if value is None:
+                continue
+            if value in claimed:
+                errors.setdefault(index, []).append(f"{field} {value} appears more than once in this batch")
+            claimed[value] = index
+        if not claimed:
+            continue
+        owners = dict(db.session.query(column, Inventory.id).filter(column.in_(list(claimed))))
+        for value, index in claimed.items():
+            if value in owners and owners[value] != ids[index]:
+                errors.setdefault(index, []).append(f"{field} {value} already belongs to item {owners[value]}")
+    return errors
+
+
+def validation_failed(errors):
+    details = [{'index': index, 'errors': messages} for index, messages in sorted(errors.items())]
+    return api_error("Validation failed; nothing was written", 422, details=details)
+
+
+# ---- READ ---- #
+@api.route('/items')
+@api_login_required
+def list_items():
+    filters = inventory_filters(request.args)
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+
+    inventory_query, rank_key = filtered_inventory_query(filters)
+    page = keyset_paginate(
+        inventory_query,
+        inventory_sort_keys(filters, rank_key),
+        cursor=request.args.get('cursor'),
+        per_page=limit,
+        count=request.args.get('count', 'true') != 'false',
+    )
+    return conditional_json({
+        'items': [item_to_dict(item) for item in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+        'total': page.total,
+    })
+
+
+@api.route('/items/<int:item_id>')
+@api_login_required
+def get_item(item_id):
+    item = db.session.get(Inventory, item_id)
+    if item is None:
+        return api_error("Item not found", 404)
+    return conditional_json({'item': item_to_dict(item)})
+
+
+@api.route('/items/batch', methods=['GET', 'POST'])
+@api_login_required
+def get_items_batch():
+    """Fetches many items by id and/or asset tag in one query.
+
+    GET takes comma-separated ?ids= and ?asset_tags=; POST takes the same
+    keys as JSON lists, for batches too large for a URL.
+    """
+    if request.method == 'POST':
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return api_error("Request body must be a JSON object with 'ids' and/or 'asset_tags' lists", 400)
+        ids = payload.get('ids', [])
+        asset_tags = payload.get('asset_tags', [])
+        # Lists of scalars only: a string would be read character by character, a bool as 0 or 1
+        if not isinstance(ids, list) or not all(
+            isinstance(value, (int, str)) and not isinstance(value, bool) for value in ids
+        ):
+            return api_error("ids must be a list of integers", 400)
+    else:
+        ids = [value for value in request.args.get('ids', '').split(',') if value]
+        asset_tags = [value for value in request.args.get('asset_tags', '').split(',') if value]
+
+    try:
+        ids = [int(value) for value in ids]
+    except (TypeError, ValueError):
+        return api_error("ids must be integers", 400)
+    if not isinstance(asset_tags, list) or not all(isinstance(tag, str) for tag in asset_tags):
+        return api_error("asset_tags must be a list of strings", 400)
+    if not ids and not asset_tags:
+        return api_error("Pass ids and/or asset_tags", 400)
+    if len(ids) + len(asset_tags) > MAX_BATCH_SIZE:
+        return api_error(f"At most {MAX_BATCH_SIZE} ids and asset tags per request", 413)
+
+    items = Inventory.query.filter(or_(Inventory.id.in_(ids), Inventory.asset_tag.in_(asset_tags)))\
+        .order_by(Inventory.id).all()
+    found_ids = {item.id for item in items}
+    found_tags = {item.asset_tag for item in items}
+    payload = {
+        'items': [item_to_dict(item) for item in items],
+        'missing': {
+            'ids': [value for value in ids if value not in found_ids],
+            'asset_tags': [tag for tag in asset_tags if tag not in found_tags],
+        },
+    }
+    return conditional_json(payload) if request.method == 'GET' else jsonify(payload)
+
+
+# ---- BULK WRITE ---- #
+@api.route('/items', methods=['POST'])
+@api_login_required
+def create_items():
+    if not can_edit():
+        return api_error("You do not have permission to add inventory.", 403)
+
+    records, error = batch_payload('items')
+    if error:
+        return error
+
+    rows = []
+    errors = {}
+    for index, data in enumerate(records):
+        values, messages = parse_item(data)
+        if messages:
+            errors[index] = messages
+        rows.append(values)
+    for index, messages in find_conflicts(rows).items():
+        errors.setdefault(index, []).extend(messages)
+    if errors:
+        return validation_failed(errors)
+
+    # Every item goes in with one transaction; audit rows follow through the audit sink
+    created = db.session.scalars(insert(Inventory).returning(Inventory), rows).all()
+    now = datetime.utcnow()
+    record_audit(*[
+        audit_event("Item Added", current_user.username, f"{item.asset_tag} ({item.asset_type})", now)
+        for item in created
+    ])
+    db.session.commit()
+    invalidate_facets()
+    return jsonify(items=[item_to_dict(item) for item in created]), 201
+
+
+@api.route('/items', methods=['PATCH'])
+@api_login_required
+def update_items():
+    if not can_edit():
+        return api_error("You do not have permission to edit inventory.", 403)
+
+    records, error = batch_payload('items')
+    if error:
+        return error
+
+    rows = []
+    ids = []
+    errors = {}
+    for index, data in enumerate(records):
+        values, messages = parse_item(data, partial=True)
+        item_id = data.get('id') if isinstance(data, dict) else None
+        if not isinstance(item_id, int) or isinstance(item_id, bool):
+            messages.append("id is required")
+        elif item_id in ids:
+            messages.append(f"item {item_id} appears more than once in this batch")
+        if messages:
+            errors[index] = messages
+        rows.append(values)
+        ids.append(item_id)
+
+    # Plain rows, not ORM objects: they are only diffed against
+    existing = {row.id: row for row in db.session.execute(select(Inventory.__table__).where(Inventory.id.in_(ids)))}
+    for index, item_id in enumerate(ids):
+        if isinstance(item_id, int) and not isinstance(item_id, bool) and item_id not in existing:
+            errors.setdefault(index, []).append(f"item {item_id} not found")
+    for index, messages in find_conflicts(rows, ids).items():
+        errors.setdefault(index, []).extend(messages)
+    if errors:
+        return validation_failed(errors)
+
+    # ORM bulk UPDATE by primary key of just the fields that differ, plus one change log row per
+    # changed item; items the batch leaves as they are get neither
+    diffs = {item_id: item_diff(existing[item_id], values) for item_id, values in zip(ids, rows)}
+    changed = {item_id: diff for item_id, diff in diffs.items() if diff}
+    if changed:
+        values_by_id = dict(zip(ids, rows))
+        db.session.execute(update(Inventory), [
+            dict({field: values_by_id[item_id][field] for field in diff}, id=item_id)
+            for item_id, diff in changed.items()
+        ])
+        now = datetime.utcnow()
+        db.session.execute(insert(ChangeLog), [
+            {
+                'item_id': item_id,
+                'user_id': current_user.id,
+                'timestamp': now,
+                'change_description': describe_changes(diff, current_user.username, via=' via API'),
+                'changes': diff,
+            }
+            for item_id, diff in changed.items()
+        ])
+        db.session.commit()
+        invalidate_facets()
+    return jsonify(updated=list(changed))
+
+
+@api.route('/items', methods=['DELETE'])
+@api_login_required
+def delete_items():
+    if not current_user.is_admin():
+        return api_error("You do not have permission to delete inventory.", 403)
+
+    ids, error = batch_payload('ids')
+    if error:
+        return error
+    if not all(isinstance(item_id, int) and not isinstance(item_id, bool) for item_id in ids):
+        return api_error("ids must be integers", 400)
+
+    existing = {item_id for (item_id,) in db.session.query(Inventory.id).filter(Inventory.id.in_(ids))}
+    # Checked here rather than left to foreign keys, which SQLite does not enforce
+    referenced = sorted(db.session.scalars(union(*(
+        select(model.item_id).where(model.item_id.in_(existing)) for model in (Checkout, Loan, ChangeLog)
+    ))))
+    if referenced:
+        db.session.rollback()
+        return api_error("Some items still have checkouts, loans or change history; nothing was deleted", 409,
+                         referenced=referenced)
+    try:
+        db.session.execute(delete(Inventory).where(Inventory.id.in_(existing)))
+        db.session.commit()
+    except IntegrityError:
+        # A checkout or change made since the check above (where foreign keys are enforced)
+        db.session.rollback()
+        return api_error("Some items still have checkouts, loans or change history; nothing was deleted", 409)
+    invalidate_facets()
+    return jsonify(deleted=sorted(existing), missing=[item_id for item_id in ids if item_id not in existing])
+
+
+# ---- LOANERS ---- #
+def bulk_asset_tags():
+    """The request's asset_tags list (deduplicated), or an error response."""
+    asset_tags, error = batch_payload('asset_tags')
+    if error:
+        return None, error
+    if not all(isinstance(tag, str) and tag.strip() for tag in asset_tags):
+        return None, api_error("asset_tags must be non-empty strings", 400)
+    asset_tags = list(dict.fromkeys(tag.strip() for tag in asset_tags))
+    if len(asset_tags) > MAX_BULK_ITEMS:
+        return None, api_error(f"At most {MAX_BULK_ITEMS} asset_tags per request", 413)
+    return asset_tags, None
+
+
+@api.route('/checkouts', methods=['POST'])
+@api_login_required
+def create_checkouts():
+    """Checks out a cart of loaners to one borrower; reports each tag's outcome."""
+    asset_tags, error = bulk_asset_tags()
+    if error:
+        return error
+    borrower_name = (request.get_json(silent=True) or {}).get('borrower_name')
+    if not isinstance(borrower_name, str) or not borrower_name.strip():
+        return api_error("borrower_name is required", 400)
+
+    results = check_out_many(asset_tags, borrower_name.strip(), current_user)
+    db.session.commit()
+    return jsonify(results=[result._asdict() for result in results])
+
+
+@api.route('/returns', methods=['POST'])
+@api_login_required
+def create_returns():
+    """Checks a cart of loaners back in; reports each tag's outcome."""
+    asset_tags, error = bulk_asset_tags()
+    if error:
+        return error
+
+    results = check_in_many(asset_tags, current_user)
+    db.session.commit()
+    return jsonify(results=[result._asdict() for result in results])
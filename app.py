@@ -1,19 +1,67 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, Response, has_request_context, jsonify, render_template, request, redirect, url_for, flash, send_file
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_migrate import Migrate
 from forms import InventoryForm, CheckoutForm, UserForm, UpdateUserForm, AddInventoryForm, EditInventoryForm, LoginForm, ChangePasswordForm
-from models import db, User, Inventory, Loan, Log, ChangeLog, Checkout
-from datetime import datetime
-
-
+from models import db, User, Inventory, Loan, Log, Job
+from pagination import keyset_paginate
+from api import api as api_blueprint, token_user
+from response_cache import cached_page, init_response_cache
+from user_cache import load_cached_user, invalidate_user, user_cache_stats
+from queries import (
+    inventory_filters, filtered_inventory_query, inventory_sort_keys, loaner_status_query,
+    loaner_history_query, log_conditions, inventory_export_statement, LOANER_HISTORY_KEYS, LOG_KEYS,
+    INVENTORY_EXPORT_FIELDS,
+)
+from audit import audit_event, init_audit, record_audit
+from checkouts import (
+    CheckoutError, MAX_BULK_ITEMS, check_out, check_in, check_out_many, check_in_many, parse_asset_tags,
+)
+from history import item_history, update_item
+from dashboard import dashboard_data, refresh_summary
+from jobs import cancel_job, enqueue_job, init_jobs, recent_jobs, retry_job
+from facets import get_facets, invalidate_facets, facet_cache_stats
+from instrumentation import init_instrumentation, metrics
+from caching import TTLCache
+from exports import EXPORT_FORMATS, export_response, stream_rows
+from explain import check_query_plans
+from sqlalchemy import select
+import click
+from datetime import date
+import hmac
+import os
+import sqlite3
+import time
+import uuid
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+
+
+@event.listens_for(Engine, 'connect')
+def use_sqlite_wal(dbapi_connection, connection_record):
+    # Dev/benchmark SQLite files: lets background writers (audit spool, jobs) commit while an export is reading
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.execute('PRAGMA journal_mode=WAL')
+
+@event.listens_for(Session, 'after_begin')
+def limit_request_statements(session, transaction, connection):
+    # Web requests only; SET LOCAL ends with the transaction, so also safe behind PgBouncer
+    timeout = app.config.get('DB_STATEMENT_TIMEOUT_MS')
+    if timeout and has_request_context() and connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
 
 app = Flask(__name__)
 app.config.from_object('config.Config')
 
 db.init_app(app)
 migrate = Migrate(app, db)
+init_response_cache(app)
+init_instrumentation(app)
+init_audit(app)
+init_jobs(app)
 
 # Flask-Login setup
 login_manager = LoginManager()
@@ -23,7 +71,15 @@ login_manager.login_message = "Please log in to access this page."
 
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))  # Corrected for SQLAlchemy 2.0
+    return load_cached_user(int(user_id))  # Per-worker cache, skips the users query on most requests
+
+@login_manager.request_loader
+def load_user_from_request(request):
+    # API scripts send a bearer token instead of a session cookie; pages still need a login
+    return token_user(request) if request.blueprint == 'api' else None
+
+# JSON API for integrations (MDM, helpdesk sync scripts)
+app.register_blueprint(api_blueprint)
 
 # ---- AUTHENTICATION ROUTES ---- #
 @app.route('/login', methods=['GET', 'POST'])
@@ -85,6 +141,7 @@ def edit_user(user_id):
         if form.password.data:
             user.set_password(form.password.data)  # ✅ Only update if a new password is provided
         db.session.commit()
+        invalidate_user(user.id)
         flash(f"User {user.username} updated successfully!", "success")
         return redirect(url_for('manage_users'))
 
@@ -101,130 +158,98 @@ def delete_user(user_id):
     user = User.query.get_or_404(user_id)
     db.session.delete(user)
     db.session.commit()
+    invalidate_user(user_id)
     flash(f"User {user.username} has been deleted.", "success")
     return redirect(url_for('manage_users'))
 
-# ---- HOME/INVENTORY LIST ---- #
-@app.route('/')
+@app.route('/admin/cache-stats')
 @login_required
-def index():
-    page = request.args.get('page', 1, type=int)  # Get the page number from the URL (default is 1)
-    per_page = 25  # Number of items per page
-
-    # Get filtering parameters
-    query = request.args.get('query', '', type=str).strip()
-    asset_type = request.args.get('asset_type', '', type=str)
-    site_name = request.args.get('site_name', '', type=str)
-    assigned_to = request.args.get('assigned_to', '', type=str)
-    sort_by = request.args.get('sort_by', 'asset_tag', type=str)
-
-    # Get unique values for dropdowns from the database
-    unique_asset_types = db.session.query(Inventory.asset_type).distinct().order_by(Inventory.asset_type).all()
-    asset_types = [item[0] for item in unique_asset_types if item[0]]  # Extract values and filter out None/empty
-    
-    unique_site_names = db.session.query(Inventory.site_name).distinct().order_by(Inventory.site_name).all()
-    site_names = [item[0] for item in unique_site_names if item[0]]  # Extract values and filter out None/empty
-
-    # Start with a base query
-    inventory_query = Inventory.query
-
-    # Apply filters
-    if query:
-        inventory_query = inventory_query.filter(
-            (Inventory.asset_tag.ilike(f"%{query}%")) |
-            (Inventory.asset_type.ilike(f"%{query}%")) |
-            (Inventory.site_name.ilike(f"%{query}%")) |
-            (Inventory.assigned_to.ilike(f"%{query}%"))
-        )
+def cache_stats():
+    if not current_user.is_admin():
+        flash("Admins only!", "danger")
+        return redirect(url_for('index'))
 
-    if asset_type:
-        inventory_query = inventory_query.filter(Inventory.asset_type.ilike(f"%{asset_type}%"))
-    
-    if site_name:
-        inventory_query = inventory_query.filter(Inventory.site_name.ilike(f"%{site_name}%"))
-    
-    if assigned_to:
-        inventory_query = inventory_query.filter(Inventory.assigned_to.ilike(f"%{assigned_to}%"))
+    return jsonify(**cache_statistics())
+
+def cache_statistics():
+    response_cache = app.extensions.get('response_cache')
+    return {
+        'user_cache': user_cache_stats(),
+        'response_cache': response_cache.stats() if response_cache else None,
+        'facet_cache': facet_cache_stats(),
+    }
 
-    # Sorting logic
-    if sort_by == "asset_tag":
-        inventory_query = inventory_query.order_by(Inventory.asset_tag)
-    elif sort_by == "site_name":
-        inventory_query = inventory_query.order_by(Inventory.site_name)
-    elif sort_by == "assigned_to":
-        inventory_query = inventory_query.order_by(Inventory.assigned_to)
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint: per-endpoint request, SQL and template timings plus cache stats."""
+    token = app.config.get('METRICS_TOKEN')
+    authorized = (token and hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")) \
+        or (current_user.is_authenticated and current_user.is_admin())
+    if not authorized:
+        return Response("Forbidden\n", status=403, mimetype='text/plain')
 
-    # Apply pagination
-    inventory = inventory_query.paginate(page=page, per_page=per_page, error_out=False)
+    caches = {name.replace('_cache', ''): stats for name, stats in cache_statistics().items()}
+    return Response(metrics.render(caches), mimetype='text/plain; version=0.0.4')
+
+# ---- HOME/INVENTORY LIST ---- #
+PER_PAGE = 25  # Number of items per page
+
+def render_inventory_list(filters):
+    # Dropdown values and per-facet counts come from the facet cache, not DISTINCT scans
+    facets = get_facets(filters, filtered_inventory_query)
+
+    # Seek to the requested page instead of OFFSET, so deep pages cost the same as page 1
+    inventory_query, rank_key = filtered_inventory_query(filters)
+    inventory = keyset_paginate(
+        inventory_query,
+        inventory_sort_keys(filters, rank_key),
+        cursor=request.args.get('cursor'),
+        per_page=PER_PAGE,
+    )
+
+    # Non-empty filters are carried along in the pagination links
+    page_args = {key: value for key, value in filters.items() if value}
 
     return render_template(
-        'inventory.html', 
-        inventory=inventory, 
-        query=query, 
-        asset_type=asset_type, 
-        site_name=site_name, 
-        assigned_to=assigned_to, 
-        sort_by=sort_by,
-        asset_types=asset_types,
-        site_names=site_names
+        'inventory.html',
+        inventory=inventory,
+        page_args=page_args,
+        asset_types=facets['asset_type'],
+        site_names=facets['site_name'],
+        export_formats=EXPORT_FORMATS,
+        **filters
     )
 
+@app.route('/')
+@login_required
+@cached_page('inventory')
+def index():
+    return render_inventory_list(inventory_filters(request.args))
+
 @app.route('/search')
+@cached_page('inventory')
 def search():
-    query = request.args.get('query', '', type=str).strip()
-    asset_type = request.args.get('asset_type', '', type=str)
-    site_name = request.args.get('site_name', '', type=str)
-    sort_by = request.args.get('sort_by', 'asset_tag', type=str)
-    page = request.args.get('page', 1, type=int)
-    per_page = 25
-
-    # Get unique values for dropdowns from the database
-    unique_asset_types = db.session.query(Inventory.asset_type).distinct().order_by(Inventory.asset_type).all()
-    asset_types = [item[0] for item in unique_asset_types if item[0]]  # Extract values and filter out None/empty
-    
-    unique_site_names = db.session.query(Inventory.site_name).distinct().order_by(Inventory.site_name).all()
-    site_names = [item[0] for item in unique_site_names if item[0]]  # Extract values and filter out None/empty
-
-    # Start with a base query
-    search_query = Inventory.query
-
-    # Apply search filter on relevant fields
-    if query:
-        search_query = search_query.filter(
-            (Inventory.asset_tag.ilike(f"%{query}%")) |
-            (Inventory.asset_type.ilike(f"%{query}%")) |
-            (Inventory.site_name.ilike(f"%{query}%")) |
-            (Inventory.assigned_to.ilike(f"%{query}%"))
-        )
+    return render_inventory_list(inventory_filters(request.args))
 
-    # Apply filters
-    if asset_type:
-        search_query = search_query.filter(Inventory.asset_type.ilike(f"%{asset_type}%"))
-    
-    if site_name:
-        search_query = search_query.filter(Inventory.site_name.ilike(f"%{site_name}%"))
+@app.route('/dashboard')
+@login_required
+def dashboard():
+    # Reads only the summary table; the job runner or `flask refresh-dashboard` rebuilds it
+    return render_template('dashboard.html', **dashboard_data())
 
-    # Sorting logic
-    if sort_by == "asset_tag":
-        search_query = search_query.order_by(Inventory.asset_tag)
-    elif sort_by == "site_name":
-        search_query = search_query.order_by(Inventory.site_name)
-    elif sort_by == "assigned_to":
-        search_query = search_query.order_by(Inventory.assigned_to)
+@app.route('/inventory/export')
+@login_required
+def export_inventory():
+    """The whole filtered, sorted inventory list (same args as index()) as a download."""
+    export_format = request.args.get('format', 'csv', type=str)
+    if export_format not in EXPORT_FORMATS:
+        flash(f"Unsupported export format: {export_format}", "danger")
+        return redirect(url_for('index'))
 
-    # Apply pagination
-    inventory_items = search_query.paginate(page=page, per_page=per_page, error_out=False)
+    statement = inventory_export_statement(inventory_filters(request.args))
 
-    return render_template(
-        'inventory.html', 
-        inventory=inventory_items, 
-        query=query, 
-        asset_type=asset_type, 
-        site_name=site_name, 
-        sort_by=sort_by,
-        asset_types=asset_types,
-        site_names=site_names
-    )
+    # Streamed from a server-side cursor, so memory does not grow with the result
+    return export_response(export_format, INVENTORY_EXPORT_FIELDS, stream_rows(db.session, statement), 'inventory')
 
 # ---- INVENTORY MANAGEMENT ---- #
 
@@ -273,15 +298,10 @@ def add_inventory():
         db.session.add(new_item)
         
         # Add a log entry for the new item
-        log_entry = Log(
-            action="Item Added",
-            user=current_user.username,
-            item_name=f"{new_item.asset_tag} ({new_item.asset_type})",
-            timestamp=datetime.utcnow()
-        )
-        db.session.add(log_entry)
+        record_audit(audit_event("Item Added", current_user.username, f"{new_item.asset_tag} ({new_item.asset_type})"))
         
         db.session.commit()
+        invalidate_facets()
         flash("Inventory item added successfully!", "success")
         return redirect(url_for('item_details', item_id=new_item.id))
 
@@ -299,40 +319,34 @@ def edit_inventory(item_id):
     form = InventoryForm(obj=item)  # Pre-fill form
 
     if form.validate_on_submit():
-        # Update basic information
-        item.site_name = form.site_name.data
-        item.asset_tag = form.asset_tag.data
-        item.asset_type = form.asset_type.data
-        item.model = form.model.data
-        item.serial_number = form.serial_number.data
-        item.notes = form.notes.data
-        
-        # Update location information
-        item.room_number = form.room_number.data
-        item.room_name = form.room_name.data
-        
-        # Update assignment information
-        item.assigned_to = form.assigned_to.data
-        item.date_assigned = form.date_assigned.data
-        item.date_decommissioned = form.date_decommissioned.data
-        
-        # Update category (from the custom form field)
-        item.category = request.form.get('category', '')
-        
-        # Update loaner status
-        item.is_loaner = 'is_loaner' in request.form
-        
-        # Add a change log entry
-        change_log = ChangeLog(
-            item_id=item.id,
-            user_id=current_user.id,
-            timestamp=datetime.utcnow(),
-            change_description=f"Item updated by {current_user.username}"
-        )
-        db.session.add(change_log)
-        
-        # Save changes
+        values = {
+            # Basic information
+            'site_name': form.site_name.data,
+            'asset_tag': form.asset_tag.data,
+            'asset_type': form.asset_type.data,
+            'model': form.model.data,
+            'serial_number': form.serial_number.data,
+            'notes': form.notes.data,
+            # Location information
+            'room_number': form.room_number.data,
+            'room_name': form.room_name.data,
+            # Assignment information
+            'assigned_to': form.assigned_to.data,
+            'date_assigned': form.date_assigned.data,
+            'date_decommissioned': form.date_decommissioned.data,
+            # Category (from the custom form field)
+            'category': request.form.get('category', ''),
+            # Loaner status
+            'is_loaner': 'is_loaner' in request.form,
+        }
+
+        # Only changed fields are written, along with a change log entry listing them
+        if update_item(item, values, current_user) is None:
+            flash("No changes to save.", "info")
+            return redirect(url_for('item_details', item_id=item.id))
+
         db.session.commit()
+        invalidate_facets()
         flash("Inventory item updated successfully!", "success")
         return redirect(url_for('item_details', item_id=item.id))
 
@@ -348,106 +362,109 @@ def delete_inventory(item_id):
     item = Inventory.query.get_or_404(item_id)
     db.session.delete(item)
     db.session.commit()
+    invalidate_facets()
     flash("Inventory item deleted!", "success")
     return redirect(url_for('index'))
 
 @app.route("/inventory/checkout/<int:item_id>", methods=["POST"])
 @login_required
 def checkout_inventory(item_id):
+    borrower_name = (request.form.get("borrower_name") or "").strip()
+    if not borrower_name:
+        flash("Borrower name is required", "danger")
+        return redirect(url_for("loaner_inventory"))
+
     try:
-        # Ensure we get the latest data
-        db.session.expire_all()
-        
-        # Fetch the item and verify it exists
-        item = Inventory.query.get_or_404(item_id)
-        borrower_name = request.form.get("borrower_name")
-        
-        if not borrower_name:
-            flash("Borrower name is required", "danger")
-            return redirect(url_for("loaner_inventory"))
-        
-        # Check if item is a loaner
-        if not item.is_loaner:
-            flash(f"{item.asset_tag} is not a loaner device", "warning")
-            return redirect(url_for("loaner_inventory"))
-        
-        # Direct SQL check for active checkouts to avoid caching issues
-        active_checkouts = Checkout.query.filter_by(item_id=item.id, return_date=None).all()
-        
-        if active_checkouts:
-            flash(f"{item.asset_tag} is already checked out", "warning")
-            return redirect(url_for("loaner_inventory"))
-        
-        # Create the checkout record
-        new_checkout = Checkout(
-            user_id=current_user.id,
-            item_id=item.id,
-            borrower_name=borrower_name,
-            checkout_date=datetime.utcnow()
-        )
-        
-        # Add a log entry for the checkout
-        log_entry = Log(
-            action="Device Checkout",
-            user=current_user.username,
-            item_name=f"{item.asset_tag} ({item.asset_type})",
-            timestamp=datetime.utcnow()
-        )
-        
-        db.session.add(new_checkout)
-        db.session.add(log_entry)
+        # One INSERT ... RETURNING; the open-checkout unique index settles races
+        item_name = check_out(item_id, borrower_name, current_user)
         db.session.commit()
-        
-        # Verify the checkout was created
-        verify_checkout = Checkout.query.filter_by(id=new_checkout.id).first()
-        if verify_checkout:
-            flash(f"{item.asset_tag} checked out to {borrower_name}", "success")
-        else:
-            flash("Checkout failed - please try again", "danger")
-            
+        flash(f"{item_name} checked out to {borrower_name}", "success")
+    except CheckoutError as e:
+        db.session.rollback()
+        flash(str(e), e.category)
     except Exception as e:
         db.session.rollback()
         flash(f"Error during checkout: {str(e)}", "danger")
-        
+
     return redirect(url_for("loaner_inventory"))
 
 @app.route("/inventory/return/<int:checkout_id>", methods=["POST"])
 @login_required
 def return_inventory(checkout_id):
     try:
-        # Ensure we get the latest data
-        db.session.expire_all()
-        
-        checkout = Checkout.query.get_or_404(checkout_id)
-        if checkout.return_date is None:
-            # Get item info before committing
-            item_tag = checkout.inventory_item.asset_tag
-            item_type = checkout.inventory_item.asset_type
-            borrower = checkout.borrower_name
-            
-            # Set return date
-            checkout.return_date = datetime.utcnow()
-            
-            # Add a log entry for the return
-            log_entry = Log(
-                action="Device Return",
-                user=current_user.username,
-                item_name=f"{item_tag} ({item_type})",
-                timestamp=datetime.utcnow()
-            )
-            db.session.add(log_entry)
-            db.session.commit()
-            
-            flash(f"{item_tag} returned successfully from {borrower}", "success")
-        else:
-            flash("Item is already returned", "warning")
-    
+        # One UPDATE ... WHERE return_date IS NULL RETURNING
+        item_name, borrower = check_in(checkout_id, current_user)
+        db.session.commit()
+        flash(f"{item_name} returned successfully from {borrower}", "success")
+    except CheckoutError as e:
+        db.session.rollback()
+        flash(str(e), e.category)
     except Exception as e:
         db.session.rollback()
         flash(f"Error during check-in: {str(e)}", "danger")
-        
+
     return redirect(url_for("loaner_inventory"))
 
+@app.route("/inventory/loaners/bulk", methods=["GET", "POST"])
+@login_required
+def bulk_checkout():
+    """Checks out or returns a whole cart of loaners, typed or scanned as asset tags."""
+    mode = request.form.get("mode", "checkout")
+    borrower_name = (request.form.get("borrower_name") or "").strip()
+    asset_tags_text = request.form.get("asset_tags", "")
+    results = []
+
+    if request.method == "POST":
+        asset_tags = parse_asset_tags(asset_tags_text)
+        if not asset_tags:
+            flash("Enter or scan at least one asset tag", "danger")
+        elif len(asset_tags) > MAX_BULK_ITEMS:
+            flash(f"At most {MAX_BULK_ITEMS} devices at a time", "danger")
+        elif mode == "checkout" and not borrower_name:
+            flash("Borrower name is required", "danger")
+        else:
+            try:
+                if mode == "checkout":
+                    results = check_out_many(asset_tags, borrower_name, current_user)
+                else:
+                    results = check_in_many(asset_tags, current_user)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                results = []
+                flash(f"Error during bulk {'checkout' if mode == 'checkout' else 'check-in'}: {str(e)}", "danger")
+
+            done = sum(result.ok for result in results)
+            if results:
+                flash(f"{done} of {len(results)} devices {'checked out' if mode == 'checkout' else 'returned'}",
+                      "success" if done == len(results) else "warning")
+            if done == len(results):
+                asset_tags_text = ""  # Ready for the next cart
+
+    return render_template(
+        "bulk_checkout.html",
+        mode=mode,
+        borrower_name=borrower_name,
+        asset_tags=asset_tags_text,
+        results=results,
+        max_items=MAX_BULK_ITEMS,
+    )
+
+LOG_PER_PAGE = 50
+LOG_EXPORT_FIELDS = ('timestamp', 'action', 'user', 'item_name')
+
+# Distinct log actions for the filter dropdown (an index-only scan, but no need to repeat it)
+_log_actions = TTLCache(maxsize=1, ttl=300)
+
+def log_filters_from_request():
+    """Reads the /logs filters; unparseable dates are ignored."""
+    return {
+        'start': request.args.get('start', None, type=date.fromisoformat),
+        'end': request.args.get('end', None, type=date.fromisoformat),
+        'action': request.args.get('action', '', type=str),
+        'user': request.args.get('user', '', type=str).strip(),
+    }
+
 @app.route('/logs')
 @login_required
 def logs():
@@ -455,16 +472,65 @@ def logs():
         flash("Admins only!", "danger")
         return redirect(url_for('index'))
 
-    logs = Log.query.order_by(Log.timestamp.desc()).all()
-    return render_template('logs.html', logs=logs)
+    filters = log_filters_from_request()
+    actions = _log_actions.get_or_set('actions', lambda: [
+        action for (action,) in db.session.query(Log.action).distinct().order_by(Log.action)
+    ])
+
+    # Newest first, seeking on (timestamp, id); the log only grows, so skip COUNT(*)
+    logs = keyset_paginate(
+        Log.query.filter(*log_conditions(filters)),
+        LOG_KEYS,
+        cursor=request.args.get('cursor'),
+        per_page=LOG_PER_PAGE,
+        count=False,
+    )
+    page_args = {key: value for key, value in filters.items() if value}
+
+    return render_template('logs.html', logs=logs, actions=actions, page_args=page_args, **filters)
+
+@app.route('/logs/export')
+@login_required
+def export_logs():
+    if current_user.role != "Admin":
+        flash("Admins only!", "danger")
+        return redirect(url_for('index'))
+
+    export_format = request.args.get('format', 'csv', type=str)
+    if export_format not in EXPORT_FORMATS:
+        flash(f"Unsupported export format: {export_format}", "danger")
+        return redirect(url_for('logs'))
+
+    statement = select(Log.timestamp, Log.action, Log.user, Log.item_name)\
+        .where(*log_conditions(log_filters_from_request()))\
+        .order_by(Log.timestamp.desc(), Log.id.desc())
+
+    # Rows are streamed from a server-side cursor, never materialized as a whole
+    return export_response(export_format, LOG_EXPORT_FIELDS, stream_rows(db.session, statement), 'logs')
 
 @app.route('/inventory/details/<int:item_id>')
 @login_required
+@cached_page('inventory', 'loan', 'change_log', 'user')
 def item_details(item_id):
     item = Inventory.query.get_or_404(item_id)
     loan_history = Loan.query.filter_by(item_id=item.id).order_by(Loan.checkout_date.desc()).all()
-    
-    return render_template('item_details.html', item=item, loan_history=loan_history)
+    history = item_history(item)
+
+    # ?version=<change id> shows the item as it was right after that change
+    version = request.args.get('version', type=int)
+    shown, shown_change = item, None
+    if version is not None:
+        for change, snapshot in history:
+            if change.id == version and snapshot is not None:
+                shown, shown_change = snapshot, change
+                break
+        else:
+            flash("That version of the item is not available.", "warning")
+
+    return render_template(
+        'item_details.html', item=shown, version=shown_change,
+        history=history, loan_history=loan_history,
+    )
 
 #@app.route('/loaner_inventory')
 # @login_required
@@ -474,25 +540,15 @@ def item_details(item_id):
 
 @app.route("/inventory/loaners")
 @login_required
+@cached_page('inventory', 'checkout', 'user')
 def loaner_inventory():
-    # Clear any cached data
-    db.session.expire_all()
-    
-    # Get all loaner items with a fresh query that includes their active checkouts
-    loaners = Inventory.query.filter_by(is_loaner=True).all()
-    
-    # For each loaner, directly query its active checkouts to bypass any caching
+    # One query for every loaner with its active checkout (and who checked it out), if any
+    rows = loaner_status_query().all()
+
+    loaners = []
     loaner_with_status = []
-    for item in loaners:
-        # Get active checkouts directly from database
-        active_checkouts = Checkout.query.filter_by(
-            item_id=item.id, 
-            return_date=None
-        ).order_by(Checkout.checkout_date.desc()).all()
-        
-        # First active checkout or None
-        active_checkout = active_checkouts[0] if active_checkouts else None
-        
+    for item, active_checkout in rows:
+        loaners.append(item)
         loaner_with_status.append({
             'item': item,
             'active_checkout': active_checkout,
@@ -505,17 +561,29 @@ def loaner_inventory():
         loaner_with_status=loaner_with_status
     )
 
+HISTORY_PER_PAGE = 50
+
 @app.route("/inventory/loaner-history")
 @login_required
+@cached_page('inventory', 'checkout', 'user')
 def loaner_history():
-    # Query all checkouts for loaner items
-    checkouts = Checkout.query\
-        .join(Inventory, Checkout.item_id == Inventory.id)\
-        .filter(Inventory.is_loaner == True)\
-        .order_by(Checkout.checkout_date.desc())\
-        .all()
-    
-    return render_template("loaner_history.html", checkouts=checkouts)
+    filters = {
+        'item': request.args.get('item', '', type=str).strip(),
+        'borrower': request.args.get('borrower', '', type=str).strip(),
+        'start': request.args.get('start', None, type=date.fromisoformat),
+        'end': request.args.get('end', None, type=date.fromisoformat),
+    }
+
+    checkouts = keyset_paginate(
+        loaner_history_query(filters),
+        LOANER_HISTORY_KEYS,
+        cursor=request.args.get('cursor'),
+        per_page=HISTORY_PER_PAGE,
+        count=False,
+    )
+    page_args = {key: value for key, value in filters.items() if value}
+
+    return render_template("loaner_history.html", checkouts=checkouts, page_args=page_args, **filters)
 
 @app.route('/change-password', methods=['GET', 'POST'])
 @login_required
@@ -531,15 +599,9 @@ def change_password():
                 current_user.set_password(form.new_password.data)
                 
                 # Create log entry
-                log_entry = Log(
-                    action="Password Change",
-                    user=current_user.username,
-                    item_name="User Account",
-                    timestamp=datetime.utcnow()
-                )
-                
-                db.session.add(log_entry)
+                record_audit(audit_event("Password Change", current_user.username, "User Account"))
                 db.session.commit()
+                invalidate_user(current_user.id)
                 
                 flash("Your password has been updated successfully.", "success")
                 return redirect(url_for('index'))
@@ -549,3 +611,218 @@ def change_password():
             flash("Current password is incorrect.", "danger")
     
     return render_template('change_password.html', form=form)
+
+# ---- BACKGROUND JOBS ---- #
+
+@app.route('/admin/jobs')
+@login_required
+def jobs():
+    if not current_user.is_admin():
+        flash("Admins only!", "danger")
+        return redirect(url_for('index'))
+
+    recent = recent_jobs()
+    return render_template(
+        'jobs.html',
+        jobs=recent,
+        polling=any(job.active for job in recent),
+        export_formats=EXPORT_FORMATS,
+        filters=inventory_filters(request.args),
+    )
+
+@app.route('/admin/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    """JSON status of one job, for polling."""
+    if not current_user.is_admin():
+        return jsonify(error="Admins only"), 403
+
+    job = Job.query.get_or_404(job_id)
+    return jsonify(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        progress=job.progress,
+        total=job.total,
+        message=job.message,
+        download=url_for('download_job_result', job_id=job.id) if job.result_path else None,
+    )
+
+@app.route('/admin/jobs/import', methods=['POST'])
+@login_required
+def queue_import():
+    if not current_user.is_admin():
+        flash("Admins only!", "danger")
+        return redirect(url_for('index'))
+
+    upload = request.files.get('csv_file')
+    if upload is None or not upload.filename:
+        flash("Choose a CSV file to import", "danger")
+        return redirect(url_for('jobs'))
+
+    # Saved under a random name; the job only ever sees this path
+    input_path = os.path.join(app.extensions['job_runner'].files_dir, f"import-{uuid.uuid4().hex}.csv")
+    upload.save(input_path)
+    params = {
+        'filename': upload.filename,
+        'delta': bool(request.form.get('delta')),
+        'decommission': bool(request.form.get('decommission')),
+    }
+    job = enqueue_job('import', current_user, params=params, input_path=input_path)
+    flash(f"Import of {upload.filename} queued as job {job.id}", "success")
+    return redirect(url_for('jobs'))
+
+@app.route('/admin/jobs/export', methods=['POST'])
+@login_required
+def queue_export():
+    if not current_user.is_admin():
+        flash("Admins only!", "danger")
+        return redirect(url_for('index'))
+
+    export_format = request.form.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        flash(f"Unsupported export format: {export_format}", "danger")
+        return redirect(url_for('jobs'))
+
+    filters = {key: value for key, value in inventory_filters(request.form).items() if value}
+    job = enqueue_job('export', current_user, params={'format': export_format, 'filters': filters})
+    flash(f"Export queued as job {job.id}", "success")
+    return redirect(url_for('jobs'))
+
+@app.route('/admin/jobs/<int:job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_queued_job(job_id):
+    if not current_user.is_admin():
+        flash("Admins only!", "danger")
+        return redirect(url_for('index'))
+
+    job = Job.query.get_or_404(job_id)
+    cancel_job(job)
+    flash(f"Job {job.id} {'cancelled' if job.status == 'cancelled' else 'will stop shortly'}", "info")
+    return redirect(url_for('jobs'))
+
+@app.route('/admin/jobs/<int:job_id>/retry', methods=['POST'])
+@login_required
+def retry_failed_job(job_id):
+    if not current_user.is_admin():
+        flash("Admins only!", "danger")
+        return redirect(url_for('index'))
+
+    job = Job.query.get_or_404(job_id)
+    retry_job(job)
+    flash(f"Job {job.id} queued again", "info")
+    return redirect(url_for('jobs'))
+
+@app.route('/admin/jobs/<int:job_id>/download')
+@login_required
+def download_job_result(job_id):
+    if not current_user.is_admin():
+        flash("Admins only!", "danger")
+        return redirect(url_for('index'))
+
+    job = Job.query.get_or_404(job_id)
+    if job.status != 'succeeded' or not job.result_path or not os.path.exists(job.result_path):
+        flash("That job has no file to download", "warning")
+        return redirect(url_for('jobs'))
+    return send_file(job.result_path, as_attachment=True, download_name=os.path.basename(job.result_path))
+
+# ---- CLI ---- #
+@app.cli.command('refresh-dashboard')
+def refresh_dashboard():
+    """Rebuilds the dashboard summary now (e.g. from cron, where no job runner refreshes it)."""
+    refresh_summary(force=True)
+    click.echo("Dashboard summary rebuilt.")
+
+@app.cli.command('api-token')
+@click.argument('username')
+@click.option('--revoke', is_flag=True, help="remove the user's token instead of issuing one")
+def api_token(username, revoke):
+    """Issues USERNAME a new API token (replacing any old one) for `Authorization: Bearer` requests."""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.UsageError(f"No user named {username}")
+    if revoke:
+        user.api_token_hash = None
+        token = None
+    else:
+        token = user.set_api_token()
+    db.session.commit()
+    invalidate_user(user.id)
+    if token:
+        click.echo(f"API token for {username} (shown once; it acts with their {user.role} role):\n{token}")
+    else:
+        click.echo(f"API token for {username} revoked.")
+
+@app.cli.command('import-inventory')
+@click.argument('sources', nargs=-1, required=True)
+@click.option('--workers', type=int, help="parser processes and shard writers (default: CPU count)")
+@click.option('--batch-size', type=int, default=500, show_default=True, help="rows per batch/commit")
+@click.option('--dry-run', is_flag=True, help="parse and check the files without writing")
+@click.option('--delta', is_flag=True, help="skip rows unchanged since they were last imported")
+@click.option('--rejects', default='import_rejects.csv', show_default=True, help="where to write rejected rows")
+def import_inventory_files(sources, workers, batch_size, dry_run, delta, rejects):
+    """Imports every CSV in SOURCES (directories or globs), e.g. one export per site."""
+    from import_parser import RejectsFile
+    from multi_import import csv_paths, import_files  # It imports import_inventory, which imports this module
+
+    paths = csv_paths(sources)
+    if not paths:
+        raise click.UsageError("No CSV files found")
+
+    def report(parsed):
+        if parsed.error:
+            click.echo(f"✗ {parsed.path}: {parsed.error}")
+        else:
+            click.echo(f"⏳ {parsed.path}: {len(parsed.records)} rows, {len(parsed.rejects)} rejects")
+
+    with RejectsFile(rejects) as rejects_file:
+        stats, conflicts, failed = import_files(
+            paths, workers=workers, batch_size=batch_size, dry_run=dry_run, delta=delta, progress=report,
+            rejects=rejects_file,
+        )
+    if failed:
+        click.echo(f"Nothing imported: {len(failed)} of {len(paths)} files could not be read.")
+        raise SystemExit(1)
+    for conflict in conflicts:
+        sources_text = ', '.join(f"{name}:{number}" for name, number in conflict.sources)
+        kept = f"{conflict.kept[0]}:{conflict.kept[1]}"
+        click.echo(f"⚠️ {conflict.kind.replace('_', ' ')} {conflict.value} in {sources_text}; kept {kept}")
+    click.echo(f"{'✅ Dry run complete, nothing written' if dry_run else '✅ Imported'} "
+               f"{len(paths)} files: {stats}, {len(conflicts)} cross-file conflicts")
+    if stats.rejected:
+        click.echo(f"⚠️ {stats.rejected} rows rejected, see {rejects}")
+
+@app.cli.command('run-jobs')
+@click.option('--workers', type=int, help="job threads (default: JOBS_WORKERS)")
+def run_jobs(workers):
+    """Runs queued background jobs (and the dashboard refresh) until interrupted; startup.sh starts one."""
+    runner = app.extensions['job_runner']
+    if workers:
+        runner.workers = workers
+    runner.start()
+    click.echo(f"Running jobs on {runner.workers} thread(s); Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pass
+
+@app.cli.command('check-indexes')
+@click.option('--verbose', is_flag=True, help="print every statement and its plan")
+def check_indexes(verbose):
+    """EXPLAINs the app's main queries and fails if any reads a whole table."""
+    failures = 0
+    for name, statements in check_query_plans().items():
+        scanned = sorted({table for _, _, tables in statements for table in tables})
+        if scanned:
+            failures += 1
+            click.echo(f"✗ {name}: full scan of {', '.join(scanned)}")
+        else:
+            click.echo(f"✓ {name}")
+        if verbose or scanned:
+            for statement, plan, _ in statements:
+                click.echo(f"    {' '.join(statement.split())}")
+                for line in plan:
+                    click.echo(f"      {line}")
+    if failures:
+        raise SystemExit(1)
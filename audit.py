@@ -0,0 +1,262 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so init_audit() falls back to the sync sink
+    fcntl = None
+
+from flask import current_app
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from models import db, Log
+
+logger = logging.getLogger(__name__)
+
+# Session.info key holding audit events until the request's transaction commits
+PENDING_KEY = 'audit_events'
+
+
+def audit_event(action, user, item_name, timestamp=None):
+    """One audit log entry, as the Log column values."""
+    return {
+        'action': action,
+        'user': user,
+        'item_name': item_name,
+        'timestamp': timestamp or datetime.utcnow(),
+    }
+
+
+class SyncAuditSink:
+    """Writes audit rows in the caller's transaction (the fallback, and the mode for tests)."""
+
+    def record(self, session, events):
+        session.execute(insert(Log), events)
+
+    def close(self):
+        pass
+
+
+class SpoolingAuditSink:
+    """Takes audit rows off the request path; a background thread inserts them in batches.
+
+    Events are held on the session until its transaction commits (a rolled
+    back request logs nothing), then appended to a spool file on disk and
+    fsynced before the request returns. The writer thread rotates the spool
+    every `flush_interval` seconds, or as soon as `batch_size` events are
+    waiting, inserts each closed file with one executemany and deletes it.
+    Files left by a crashed process are claimed and replayed by the next
+    one, so delivery is at-least-once: a crash between the insert and the
+    delete can log those events twice, never zero times.
+
+    Each process names its files after a random owner id and holds an
+    flock on audit-<owner>.lock while it lives. The kernel drops the lock
+    when the process dies, so a lock another process can take marks
+    orphans, even after a restart hands the dead process's pid to a new
+    one.
+    """
+
+    def __init__(self, app, spool_dir, batch_size=500, flush_interval=1.0, fsync=True):
+        self.app = app
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        os.makedirs(spool_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._file = None
+        self._pending = 0
+        self._sequence = 0
+        self._pid = None
+        self._owner = None
+        self._owner_lock = None
+        self._thread = None
+
+    def _segment_path(self, owner, sequence, state):
+        return os.path.join(self.spool_dir, f'audit-{owner}-{sequence:08d}.{state}')
+
+    def _lock_path(self, owner):
+        return os.path.join(self.spool_dir, f'audit-{owner}.lock')
+
+    def start(self):
+        with self._lock:
+            self._ensure_writer()
+
+    def _ensure_writer(self):
+        # Started lazily, in whichever (forked) worker process records first
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            if self._owner_lock is not None:
+                self._owner_lock.close()  # A forked child must not keep its parent's lock held
+            self._owner = uuid.uuid4().hex
+            # Locked before it is renamed into view, so no other process can take it first
+            temporary_path = os.path.join(self.spool_dir, f'.{self._owner}.lock')
+            self._owner_lock = open(temporary_path, 'w')
+            fcntl.flock(self._owner_lock, fcntl.LOCK_EX)
+            os.replace(temporary_path, self._lock_path(self._owner))
+            self._file = None
+            self._pending = 0
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def record(self, session, events):
+        session.info.setdefault(PENDING_KEY, []).extend(events)
+
+    def spool(self, events):
+        """Appends committed events to the current spool file."""
+        lines = ''.join(json.dumps(dict(e, timestamp=e['timestamp'].isoformat())) + '\n' for e in events)
+        with self._lock:
+            self._ensure_writer()
+            if self._file is None:
+                self._sequence += 1
+                self._file = open(self._segment_path(self._owner, self._sequence, 'open'), 'a', encoding='utf-8')
+            self._file.write(lines)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._pending += len(events)
+            if self._pending >= self.batch_size:
+                self._wake.set()
+
+    def _rotate(self):
+        """Closes the current spool file so the writer can take it."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            path = self._file.name
+            os.replace(path, path[:-len('open')] + 'ready')
+            self._file = None
+            self._pending = 0
+
+    def _claim_orphans(self):
+        """Renames spool files of processes that are gone, so this one replays them.
+
+        An owner is gone when its lock can be taken, or when it has spool
+        files but no lock file (a process locks before it spools).
+        """
+        owners = {
+            os.path.basename(path).split('-')[1].split('.')[0]
+            for path in glob.glob(os.path.join(self.spool_dir, 'audit-*'))
+        }
+        owners.discard(self._owner)
+        for owner in owners:
+            lock_path = self._lock_path(owner)
+            try:
+                lock_file = open(lock_path)
+            except FileNotFoundError:
+                lock_file = None
+            try:
+                if lock_file is not None:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # Its process is alive
+                for path in glob.glob(os.path.join(self.spool_dir, f'audit-{owner}-*.*')):
+                    self._sequence += 1
+                    try:
+                        os.replace(path, self._segment_path(self._owner, self._sequence, 'ready'))
+                    except FileNotFoundError:
+                        pass  # Another process claimed it first
+                if lock_file is not None:
+                    try:
+                        os.remove(lock_path)
+                    except FileNotFoundError:
+                        pass
+            finally:
+                if lock_file is not None:
+                    lock_file.close()
+
+    def flush(self):
+        """Inserts every ready spool file of this process; files that fail stay for the next try."""
+        self._rotate()
+        with self._lock:
+            self._claim_orphans()
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, f'audit-{self._owner}-*.ready'))):
+            events = _read_spool(path)
+            if events:
+                with self.app.app_context(), db.engine.begin() as connection:
+                    connection.execute(insert(Log.__table__), events)
+            os.remove(path)
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Audit log flush failed; spooled events will be retried")
+
+    def close(self):
+        """Flushes what is spooled; called at interpreter exit."""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=10)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Audit log flush at exit failed; spooled events are kept on disk")
+
+
+def _read_spool(path):
+    events = []
+    with open(path, encoding='utf-8') as spool_file:
+        for line in spool_file:
+            try:
+                values = json.loads(line)
+            except ValueError:
+                # A crash mid-write leaves at most one partial last line
+                logger.warning("Skipping a truncated audit spool line in %s", path)
+                continue
+            values['timestamp'] = datetime.fromisoformat(values['timestamp'])
+            events.append(values)
+    return events
+
+
+@event.listens_for(Session, 'after_commit')
+def _spool_committed_events(session):
+    events = session.info.pop(PENDING_KEY, None)
+    if events:
+        current_app.extensions['audit_sink'].spool(events)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_rolled_back_events(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(PENDING_KEY, None)
+
+
+def init_audit(app):
+    """Picks the audit sink from AUDIT_SINK: 'async' (spooled, batched) or 'sync'."""
+    if app.config.get('AUDIT_SINK', 'sync') == 'async' and fcntl is not None:
+        sink = SpoolingAuditSink(
+            app,
+            app.config.get('AUDIT_SPOOL_DIR') or os.path.join(app.instance_path, 'audit-spool'),
+            batch_size=app.config.get('AUDIT_BATCH_SIZE', 500),
+            flush_interval=app.config.get('AUDIT_FLUSH_INTERVAL', 1.0),
+            fsync=app.config.get('AUDIT_SPOOL_FSYNC', True),
+        )
+        sink.start()  # Replays spool files a crashed process left behind
+        atexit.register(sink.close)
+    else:
+        sink = SyncAuditSink()
+    app.extensions['audit_sink'] = sink
+    return sink
+
+
+def record_audit(*events):
+    """Records audit events for the current transaction through the configured sink."""
+    if events:
+        current_app.extensions['audit_sink'].record(db.session, list(events))
@@ -0,0 +1,224 @@
+"""Synthetic inventory data shaped like Cleaned_Inventory_Data.csv, at any scale."""
+import csv
+import os
+import random
+from datetime import datetime, timedelta
+from itertools import islice
+
+from flask_migrate import stamp, upgrade
+from sqlalchemy import inspect, insert, text
+from sqlalchemy.schema import CreateTable
+from werkzeug.security import generate_password_hash
+
+from import_inventory import IMPORT_COLUMNS
+from models import db, User, Inventory, Checkout, Loan, ChangeLog, Log
+
+# Row counts per scale; "large" is the 100k-asset / 1M-log target
+SCALES = {
+    'small': {'items': 5_000, 'checkouts': 5_000, 'loans': 2_000, 'changes': 10_000, 'logs': 50_000},
+    'medium': {'items': 25_000, 'checkouts': 25_000, 'loans': 10_000, 'changes': 50_000, 'logs': 250_000},
+    'large': {'items': 100_000, 'checkouts': 100_000, 'loans': 40_000, 'changes': 200_000, 'logs': 1_000_000},
+}
+
+# Tables the first migrations expect to exist; everything later comes from `flask db upgrade`
+BASELINE_TABLES = ('user', 'inventory', 'loan', 'log', 'change_log', 'checkout')
+BASELINE_REVISION = '65497c703b6c'
+# Columns of those tables that later migrations add
+LATER_COLUMNS = {'inventory': ('import_hash',), 'change_log': ('changes',), 'user': ('api_token_hash',)}
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+# Logins created by populate(); the harness signs in as the admin
+USERS = (('admin', 'Admin'), ('editor', 'Editor'), ('reader', 'Reader'))
+PASSWORD = 'benchmark'
+
+# Weighted like the real export: mostly Ridgeland, mostly monitors and cubicles
+SITES = (
+    ('Ridgeland', 70), ('Miami', 14), ('Bakersfield', 4), ('Bahamas', 4), ('Lancaster', 3),
+    ('Oxford', 2), ('Jamaica', 1), ('Hawaii', 1), ('Puerto Rico', 1),
+)
+ASSET_TYPES = {
+    'Monitor': (45, ('Dell P2222H', 'Dell P2219H', 'Dell P2425H', 'Dell P2722H')),
+    'Phone': (17, ('Polycom VVX 250', 'Polycom VVX 450', 'Yealink T54W')),
+    '16" Laptop': (9, ('Inspiron 5630', 'Inspiron 5640')),
+    'Desktop': (8, ('Optiplex 7060', 'Optiplex 7090')),
+    '17" Laptop': (3, ('Inspiron 5770',)),
+    '15" Laptop': (2, ('Latitude 5540',)),
+    'Mini PC': (2, ('Optiplex 7010 Micro',)),
+    'Docking Station': (4, ('Dell WD19S',)),
+}
+ROOMS = (('Cubicle', 52), ('Office', 17), ('IT Storage', 11), ('IT Office', 3), ('Server Room', 4),
+         ('Training Room', 3), ('Home Office', 2), ('Break Room', 1))
+FIRST_NAMES = ('Susan', 'Alisa', 'James', 'Maria', 'Robert', 'Linda', 'David', 'Karen', 'Carlos', 'Aisha',
+               'Wei', 'Priya', 'Thomas', 'Grace', 'Omar', 'Hannah', 'Luis', 'Megan', 'Victor', 'Nia')
+LAST_NAMES = ('McMillan', 'Griffin', 'Smith', 'Garcia', 'Johnson', 'Nguyen', 'Brown', 'Patel', 'Davis',
+              'Lopez', 'Wilson', 'Kim', 'Martinez', 'Clark', 'Lewis', 'Walker', 'Hall', 'Young')
+LOG_ACTIONS = (('Item Added', 30), ('Item Updated', 35), ('Device Checkout', 12), ('Device Return', 12),
+               ('Item Deleted', 3), ('Password Change', 1), ('User Added', 1))
+
+# Share of assets that are loaners, and of those currently checked out
+LOANER_RATIO = 0.02
+OPEN_CHECKOUT_RATIO = 0.3
+
+# Rows per executemany
+CHUNK_SIZE = 10_000
+
+# Generated history spans this many days back from now
+HISTORY_DAYS = 3 * 365
+
+
+def _weighted(rng, choices, k):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights, k=k)
+
+
+def _person(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def _moment(rng, now):
+    return now - timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))
+
+
+def inventory_rows(count, rng, tag_prefix='MWG'):
+    """Yields Inventory column dicts; about half have no serial and a fifth are unassigned."""
+    type_weights = [(name, weight) for name, (weight, _) in ASSET_TYPES.items()]
+    sites = _weighted(rng, SITES, count)
+    types = _weighted(rng, type_weights, count)
+    rooms = _weighted(rng, ROOMS, count)
+    for index in range(count):
+        asset_type = types[index]
+        has_serial = rng.random() < 0.55
+        yield {
+            'site_name': sites[index],
+            'room_number': str(rng.randrange(1000, 3400)),
+            'room_name': rooms[index],
+            'asset_tag': f"{tag_prefix}{index:07d}",
+            'asset_type': asset_type,
+            'model': rng.choice(ASSET_TYPES[asset_type][1]),
+            'serial_number': f"{rng.choice('CDFGHJ')}{index:09d}" if has_serial else None,
+            'category': None,
+            'notes': rng.choice(('', '', '', '', 'Home Office', 'Workbench', 'Needs cable', 'Loaner pool')),
+            'assigned_to': _person(rng) if rng.random() < 0.8 else None,
+            'date_assigned': None,
+            'date_decommissioned': None,
+            'is_loaner': rng.random() < LOANER_RATIO,
+        }
+
+
+def _chunks(rows, size=CHUNK_SIZE):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _insert(table, rows):
+    for chunk in _chunks(rows):
+        db.session.execute(insert(table), chunk)
+    db.session.commit()
+
+
+def create_schema():
+    """Builds the full schema (search index included) on an empty database through the migrations."""
+    with db.engine.begin() as connection:
+        quote = connection.dialect.identifier_preparer.quote
+        for name in BASELINE_TABLES:
+            # Tables only: the migrations create every index the models declare
+            connection.execute(CreateTable(db.metadata.tables[name]))
+            for column in LATER_COLUMNS.get(name, ()):
+                connection.execute(text(f"ALTER TABLE {quote(name)} DROP COLUMN {quote(column)}"))
+    stamp(directory=MIGRATIONS_DIR, revision=BASELINE_REVISION)
+    upgrade(directory=MIGRATIONS_DIR)
+
+
+def populate(scale='small', seed=1, progress=print):
+    """Creates the schema and fills it with the given scale (a SCALES key or a dict of counts).
+
+    Must run inside an app context against an empty database.
+    """
+    counts = SCALES[scale] if isinstance(scale, str) else scale
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    if inspect(db.engine).has_table('inventory'):
+        raise RuntimeError("populate() needs an empty database")
+    create_schema()
+
+    password_hash = generate_password_hash(PASSWORD)
+    _insert(User, [{'username': name, 'password_hash': password_hash, 'role': role} for name, role in USERS])
+    user_ids = [user_id for (user_id,) in db.session.query(User.id)]
+    usernames = [name for name, _ in USERS]
+
+    progress(f"inventory: {counts['items']} rows")
+    _insert(Inventory, inventory_rows(counts['items'], rng))
+    items = db.session.query(Inventory.id, Inventory.is_loaner).all()
+    item_ids = [item_id for item_id, _ in items]
+    loaner_ids = [item_id for item_id, is_loaner in items if is_loaner] or item_ids[:1]
+
+    # Checkouts per loaner in date order, so a higher id is always the later checkout
+    progress(f"checkout: {counts['checkouts']} rows")
+    per_loaner = {}
+    for item_id in rng.choices(loaner_ids, k=counts['checkouts']):
+        per_loaner.setdefault(item_id, []).append(_moment(rng, now))
+
+    def checkouts():
+        for item_id, dates in per_loaner.items():
+            dates.sort()
+            for position, checkout_date in enumerate(dates):
+                last = position == len(dates) - 1
+                if last and rng.random() < OPEN_CHECKOUT_RATIO:
+                    return_date = None
+                else:
+                    following = dates[position + 1] if not last else now
+                    return_date = checkout_date + (following - checkout_date) * rng.uniform(0.1, 0.9)
+                yield {
+                    'item_id': item_id,
+                    'user_id': rng.choice(user_ids),
+                    'borrower_name': _person(rng),
+                    'checkout_date': checkout_date,
+                    'return_date': return_date,
+                }
+    _insert(Checkout, checkouts())
+
+    progress(f"loan: {counts['loans']} rows")
+
+    def loans():
+        for item_id in rng.choices(loaner_ids, k=counts['loans']):
+            checkout_date = _moment(rng, now)
+            yield {
+                'item_id': item_id,
+                'user_name': _person(rng),
+                'checkout_date': checkout_date,
+                'return_date': checkout_date + timedelta(days=rng.randrange(1, 30)),
+            }
+    _insert(Loan, loans())
+
+    progress(f"change_log: {counts['changes']} rows")
+    _insert(ChangeLog, ({
+        'item_id': rng.choice(item_ids),
+        'user_id': rng.choice(user_ids),
+        'timestamp': _moment(rng, now),
+        'change_description': f"assigned to updated by {rng.choice(usernames)}",
+        'changes': {'assigned_to': [_person(rng), _person(rng)]},
+    } for _ in range(counts['changes'])))
+
+    progress(f"log: {counts['logs']} rows")
+    actions = _weighted(rng, LOG_ACTIONS, counts['logs'])
+    _insert(Log, ({
+        'action': action,
+        'user': rng.choice(usernames),
+        'item_name': f"MWG{rng.randrange(counts['items']):07d} (Monitor)",
+        'timestamp': _moment(rng, now),
+    } for action in actions))
+
+
+def write_import_csv(path, count, seed=1, tag_prefix='IMPORT'):
+    """Writes an importer input file in the Cleaned_Inventory_Data.csv layout."""
+    rng = random.Random(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=IMPORT_COLUMNS)
+        writer.writeheader()
+        for row in inventory_rows(count, rng, tag_prefix=tag_prefix):
+            writer.writerow({column: row[column] or '' for column in IMPORT_COLUMNS})
@@ -0,0 +1,168 @@
+"""Load-tests the app under gunicorn: the old single sync worker against gunicorn.conf.py.
+
+    python -m benchmarks.load_test --scale small --duration 20 --concurrency 16
+    python -m benchmarks.load_test --database-url postgresql://localhost/inventory_bench --workers 4 --threads 8
+
+Each run starts gunicorn on a local port, then `--concurrency` clients,
+signed in as the benchmark admin, request the benchmark routes in a loop
+for `--duration` seconds. Throughput (requests/s) and latency are reported
+per server setup.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from datetime import date, timedelta
+
+from benchmarks.run import DATA_DIR, ROUTES, percentile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The previous startup.sh command line, as the comparison point
+LEGACY_COMMAND = ['gunicorn', '--timeout', '120', 'app:app']
+TUNED_COMMAND = ['gunicorn', '--config', 'gunicorn.conf.py', 'app:app']
+
+# Routes with large or slow-to-stream bodies are left to benchmarks.run
+SKIPPED_ROUTES = {'logs_export', 'inventory_export'}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def session_cookie(app, user_id):
+    """A signed Flask session cookie logging `user_id` in, as Flask-Login would set it."""
+    serializer = app.session_interface.get_signing_serializer(app)
+    return f"{app.config['SESSION_COOKIE_NAME']}={serializer.dumps({'_user_id': str(user_id), '_fresh': True})}"
+
+
+def start_server(command, env, port):
+    process = subprocess.Popen(
+        command + ['--bind', f'127.0.0.1:{port}'],
+        cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=10).read()
+            return process
+        except OSError:  # Not listening yet
+            if process.poll() is not None:
+                raise RuntimeError(f"{' '.join(command)} exited with status {process.returncode}")
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{' '.join(command)} did not start listening within 30s")
+
+
+def hammer(base_url, urls, cookie, concurrency, duration):
+    """Runs `concurrency` looping clients for `duration` seconds; returns (latencies ms, errors)."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(offset):
+        position = offset
+        while time.monotonic() < deadline:
+            url = base_url + urls[position % len(urls)]
+            position += 1
+            started = time.perf_counter()
+            try:
+                request = urllib.request.Request(url, headers={'Cookie': cookie})
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+            except OSError as error:  # HTTP errors, refused connections, timeouts
+                with lock:
+                    errors.append(f"{url}: {error}")
+                continue
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+
+    clients = [threading.Thread(target=client, args=(offset,)) for offset in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return latencies, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare gunicorn setups under concurrent load.")
+    parser.add_argument("--scale", default="small", help="synthetic data scale when no --database-url is given")
+    parser.add_argument("--database-url", help="database to serve (default: the benchmarks/data SQLite file)")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of load per setup")
+    parser.add_argument("--concurrency", type=int, default=16, help="simultaneous clients")
+    parser.add_argument("--workers", type=int, help="WEB_CONCURRENCY for the tuned setup")
+    parser.add_argument("--threads", type=int, help="GUNICORN_THREADS for the tuned setup")
+    parser.add_argument("--with-cache", action="store_true", help="keep the rendered-page cache on")
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(DATA_DIR, f"{args.scale}.db")
+    os.makedirs(DATA_DIR, exist_ok=True)
+    os.environ['DATABASE_URL'] = database_url
+
+    from sqlalchemy import inspect
+    from app import app
+    from benchmarks.fixtures import populate
+    from models import db, Inventory, User
+
+    with app.app_context():
+        if not inspect(db.engine).has_table('inventory'):
+            print(f"Generating '{args.scale}' data into {db.engine.url.render_as_string(hide_password=True)}")
+            populate(args.scale, progress=lambda message: print(f"  {message}"))
+        admin_id = db.session.query(User.id).filter_by(username='admin').scalar()
+        item_id = db.session.query(Inventory.id).order_by(Inventory.id.desc()).limit(1).scalar()
+        db.engine.dispose()
+
+    placeholders = {'item_id': item_id, 'since': (date.today() - timedelta(days=7)).isoformat()}
+    urls = [url.format(**placeholders) for name, url in ROUTES if name not in SKIPPED_ROUTES]
+    cookie = session_cookie(app, admin_id)
+
+    env = dict(os.environ, RESPONSE_CACHE_ENABLED='1' if args.with_cache else '0', SERVER_TIMING_ENABLED='0')
+    tuned_env = dict(env)
+    if args.workers:
+        tuned_env['WEB_CONCURRENCY'] = str(args.workers)
+    if args.threads:
+        tuned_env['GUNICORN_THREADS'] = str(args.threads)
+
+    results = []
+    for label, command, server_env in (
+        ('1 sync worker (old startup.sh)', LEGACY_COMMAND, env),
+        ('gunicorn.conf.py', TUNED_COMMAND, tuned_env),
+    ):
+        port = free_port()
+        print(f"{label}: {args.concurrency} clients for {args.duration:.0f}s...")
+        process = start_server(command, server_env, port)
+        try:
+            latencies, errors = hammer(f'http://127.0.0.1:{port}', urls, cookie, args.concurrency, args.duration)
+        finally:
+            process.terminate()
+            process.wait()
+        for error in errors[:5]:
+            print(f"  ✗ {error}")
+        results.append((label, latencies, errors))
+
+    print()
+    print(f"{'setup':<32} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}")
+    for label, latencies, errors in results:
+        if not latencies:
+            print(f"{label:<32} {'-':>8} {'-':>9} {'-':>9} {len(errors):>7}")
+            continue
+        throughput = len(latencies) / args.duration
+        print(f"{label:<32} {throughput:>8.1f} {percentile(latencies, 0.5):>9.1f} "
+              f"{percentile(latencies, 0.95):>9.1f} {len(errors):>7}")
+    if all(latencies for _, latencies, _ in results):
+        gain = len(results[1][1]) / len(results[0][1])
+        print(f"\nThroughput gain: {gain:.2f}x")
+    return 1 if any(errors for _, _, errors in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""Benchmarks the app's main pages and the CSV importer against synthetic data.
+
+    python -m benchmarks.run --scale small                 # build/reuse benchmarks/data/small.db
+    python -m benchmarks.run --scale large --save-baseline
+    python -m benchmarks.run --database-url postgresql://localhost/inventory_bench
+
+Every route is requested through the Flask test client, signed in as the
+admin. Reported per route: p50/p95 latency, SQL statements per request and
+peak Python memory of one request (tracemalloc). With a saved baseline,
+anything slower, chattier or hungrier than it (beyond --tolerance) is
+flagged and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from sqlalchemy import event, inspect
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCHMARK_DIR, 'data')
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+# (name, URL) of every page benchmarked; {item_id} is a real item, {since} a recent date
+ROUTES = (
+    ('index', '/'),
+    ('index_by_site', '/?site_name=Ridgeland&asset_type=Monitor'),
+    ('index_sorted', '/?sort_by=assigned_to'),
+    ('search', '/search?query=dell'),
+    ('search_short', '/search?query=op'),
+    ('loaner_inventory', '/inventory/loaners'),
+    ('loaner_history', '/inventory/loaner-history'),
+    ('item_details', '/inventory/details/{item_id}'),
+    ('logs', '/logs'),
+    ('logs_by_action', '/logs?action=Device+Checkout'),
+    ('logs_export', '/logs/export?format=csv&start={since}'),
+    ('inventory_export', '/inventory/export?format=csv'),
+    ('dashboard', '/dashboard'),
+    ('api_items', '/api/v1/items?limit=100'),
+)
+
+# Rows in the generated importer input
+IMPORT_ROWS = 5_000
+
+# Regressions smaller than these are noise, whatever the tolerance says
+MIN_LATENCY_DELTA_MS = 2.0
+MIN_MEMORY_DELTA_KIB = 256
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(timings_ms, queries, peak_bytes):
+    return {
+        'p50_ms': round(statistics.median(timings_ms), 2),
+        'p95_ms': round(percentile(timings_ms, 0.95), 2),
+        'queries': queries,
+        'peak_kib': round(peak_bytes / 1024),
+    }
+
+
+class QueryCounter:
+    """Counts SQL statements sent to an engine."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def benchmark_route(client, url, repeat, counter):
+    def fetch():
+        response = client.get(url)
+        response.get_data()  # Drain streamed responses
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} answered {response.status_code}")
+
+    fetch()  # Warm-up: template compilation, first-use caches
+
+    counter.count = 0
+    fetch()
+    queries = counter.count
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fetch()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    try:
+        fetch()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return summarize(timings, queries, peak)
+
+
+def benchmark_import(repeat, counter):
+    """Times import_rows() on a generated CSV; the imported rows are deleted after every run."""
+    from benchmarks.fixtures import write_import_csv
+    from import_inventory import import_rows
+    from models import db, Inventory
+
+    path = os.path.join(tempfile.mkdtemp(), 'import.csv')
+    write_import_csv(path, IMPORT_ROWS)
+
+    def run():
+        with open(path, newline='', encoding='utf-8') as csvfile:
+            import_rows(csvfile)
+
+    def clean_up():
+        db.session.query(Inventory).filter(Inventory.asset_tag.like('IMPORT%')).delete(synchronize_session=False)
+        db.session.commit()
+
+    timings = []
+    queries = 0
+    for _ in range(repeat + 1):
+        counter.count = 0
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+        queries = counter.count
+        clean_up()
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        clean_up()
+    os.remove(path)
+    return summarize(timings[1:], queries, peak)
+
+
+def compare(results, baseline, tolerance):
+    """Returns a list of human-readable regressions of `results` against `baseline`."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            if result[key] > base[key] * (1 + tolerance) and result[key] - base[key] > MIN_LATENCY_DELTA_MS:
+                regressions.append(f"{name}: {key} {base[key]} -> {result[key]}")
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: queries {base['queries']} -> {result['queries']}")
+        if (result['peak_kib'] > base['peak_kib'] * (1 + tolerance)
+                and result['peak_kib'] - base['peak_kib'] > MIN_MEMORY_DELTA_KIB):
+            regressions.append(f"{name}: peak_kib {base['peak_kib']} -> {result['peak_kib']}")
+    return regressions
+
+
+def print_table(results):
+    print(f"{'route':<20} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'peak KiB':>9}")
+    for name, result in results.items():
+        print(f"{name:<20} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['queries']:>8} {result['peak_kib']:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the inventory app on synthetic data.")
+    parser.add_argument("--scale", default="small", help="small, medium or large (default: small)")
+    parser.add_argument("--database-url", help="database to use (default: a SQLite file per scale under benchmarks/data)")
+    parser.add_argument("--regenerate", action="store_true", help="rebuild the SQLite data file even if it exists")
+    parser.add_argument("--repeat", type=int, default=20, help="timed requests per route")
+    parser.add_argument("--routes", help="comma-separated route names to run (default: all, plus import)")
+    parser.add_argument("--with-cache", action="store_true", help="keep the rendered-page cache on")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if not database_url:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        path = os.path.join(DATA_DIR, f"{args.scale}.db")
+        if args.regenerate and os.path.exists(path):
+            os.remove(path)
+        database_url = 'sqlite:///' + path
+
+    # config.Config reads the environment at import time
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['RESPONSE_CACHE_ENABLED'] = '1' if args.with_cache else '0'
+    # Job runner polls would land in the per-route query counts
+    os.environ['JOBS_IN_WEB'] = '0'
+
+    from app import app
+    from benchmarks.fixtures import PASSWORD, populate
+    from dashboard import refresh_summary
+    from models import db, Inventory
+
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    selected = set(args.routes.split(',')) if args.routes else None
+
+    with app.app_context():
+        if not inspect(db.engine).has_table('inventory'):
+            print(f"Generating '{args.scale}' data into {db.engine.url.render_as_string(hide_password=True)}")
+            started = time.perf_counter()
+            populate(args.scale, progress=lambda message: print(f"  {message}"))
+            print(f"  done in {time.perf_counter() - started:.1f}s")
+        item_id = db.session.query(Inventory.id).order_by(Inventory.id.desc()).limit(1).scalar()
+        # As the job runner or cron would; the dashboard view only reads the summary
+        refresh_summary(force=True)
+        counter = QueryCounter(db.engine)
+
+    client = app.test_client()
+    response = client.post('/login', data={'username': 'admin', 'password': PASSWORD})
+    if response.status_code != 302:
+        sys.exit("Could not sign in as the benchmark admin")
+
+    placeholders = {'item_id': item_id, 'since': (date.today() - timedelta(days=7)).isoformat()}
+    results = {}
+    for name, url in ROUTES:
+        if selected is None or name in selected:
+            results[name] = benchmark_route(client, url.format(**placeholders), args.repeat, counter)
+            print(f"  {name}: p95 {results[name]['p95_ms']} ms")
+    if selected is None or 'import' in selected:
+        with app.app_context():
+            results['import'] = benchmark_import(max(args.repeat // 5, 2), counter)
+
+    print()
+    print_table(results)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('scale') != args.scale:
+            print(f"\nBaseline was recorded at scale '{baseline.get('scale')}'; not comparing.")
+        else:
+            regressions = compare(results, baseline['results'], args.tolerance)
+            print("\nRegressions against baseline:" if regressions else "\nNo regressions against baseline.")
+            for regression in regressions:
+                print(f"  ✗ {regression}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump({'scale': args.scale, 'results': results}, baseline_file, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
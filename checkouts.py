@@ -0,0 +1,195 @@
+import re
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import and_, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from audit import audit_event, record_audit
+from models import db, Inventory, Checkout
+
+# Most asset tags accepted by one bulk checkout or return
+MAX_BULK_ITEMS = 200
+
+# Outcome of one asset tag in a bulk operation
+ItemResult = namedtuple('ItemResult', 'asset_tag ok message')
+
+
+class CheckoutError(Exception):
+    """A checkout or return that was refused; `category` is the flash category to show it with."""
+
+    def __init__(self, message, category='warning'):
+        super().__init__(message)
+        self.category = category
+
+
+def _insert(table):
+    """INSERT for the active dialect, so ON CONFLICT is available."""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table)
+    if dialect == 'sqlite':
+        return sqlite.insert(table)
+    raise RuntimeError(f"Checkouts are not supported on {dialect}")
+
+
+def _item_label(item_id):
+    """The "TAG (type)" label of an item, selected without loading the item."""
+    statement = select(Inventory.asset_tag + ' (' + Inventory.asset_type + ')').where(Inventory.id == item_id)
+    return db.session.execute(statement).scalar_one()
+
+
+def check_out(item_id, borrower_name, user):
+    """Checks a loaner out in one statement; returns the item label ("TAG (type)").
+
+    The INSERT only selects the item if it is a loaner, and the partial unique
+    index on open checkouts turns a second open checkout into a no-op, so two
+    simultaneous requests cannot both succeed. The caller commits.
+    """
+    now = datetime.utcnow()
+    statement = _insert(Checkout).from_select(
+        ['item_id', 'user_id', 'borrower_name', 'checkout_date'],
+        select(Inventory.id, literal(user.id), literal(borrower_name), literal(now))
+        .where(Inventory.id == item_id, Inventory.is_loaner == True),
+    )
+    statement = statement.on_conflict_do_nothing(
+        index_elements=['item_id'],
+        index_where=Checkout.return_date.is_(None),
+    ).returning(Checkout.id)
+
+    if db.session.execute(statement).scalar() is None:
+        # Only failures pay for a lookup, to say why
+        item = db.session.get(Inventory, item_id)
+        if item is None:
+            raise CheckoutError("Item not found", 'danger')
+        if not item.is_loaner:
+            raise CheckoutError(f"{item.asset_tag} is not a loaner device")
+        raise CheckoutError(f"{item.asset_tag} is already checked out")
+
+    item_name = _item_label(item_id)
+    record_audit(audit_event("Device Checkout", user.username, item_name, now))
+    return item_name
+
+
+def check_in(checkout_id, user):
+    """Closes an open checkout in one statement; returns (item label, borrower name).
+
+    The UPDATE only matches while return_date is still NULL, so a double
+    submit or two desks returning the same device close it exactly once.
+    The caller commits.
+    """
+    now = datetime.utcnow()
+    statement = update(Checkout)\
+        .where(Checkout.id == checkout_id, Checkout.return_date.is_(None))\
+        .values(return_date=now)\
+        .returning(Checkout.item_id, Checkout.borrower_name)
+    row = db.session.execute(statement, execution_options={'synchronize_session': False}).first()
+
+    if row is None:
+        if db.session.get(Checkout, checkout_id) is None:
+            raise CheckoutError("Checkout not found", 'danger')
+        raise CheckoutError("Item is already returned")
+
+    item_name = _item_label(row.item_id)
+    record_audit(audit_event("Device Return", user.username, item_name, now))
+    return item_name, row.borrower_name
+
+
+def parse_asset_tags(text):
+    """Asset tags from typed or scanned input (one per line, or separated by commas/spaces), deduplicated."""
+    return list(dict.fromkeys(tag for tag in re.split(r'[\s,;]+', text or '') if tag))
+
+
+def _items_with_open_checkout(asset_tags):
+    """{asset tag: (item, open Checkout or None)} for the tags that exist, in one query."""
+    rows = db.session.query(Inventory, Checkout)\
+        .outerjoin(Checkout, and_(Checkout.item_id == Inventory.id, Checkout.return_date.is_(None)))\
+        .filter(Inventory.asset_tag.in_(asset_tags))
+    return {item.asset_tag: (item, checkout) for item, checkout in rows}
+
+
+def _audit_events(action, user, items, timestamp):
+    return [audit_event(action, user.username, f"{item.asset_tag} ({item.asset_type})", timestamp) for item in items]
+
+
+def check_out_many(asset_tags, borrower_name, user):
+    """Checks out every available loaner among `asset_tags` to one borrower.
+
+    One query validates all tags, one multi-row INSERT ... ON CONFLICT DO
+    NOTHING RETURNING writes the checkouts (a device taken by another desk
+    meanwhile is simply not returned); the log rows go to the audit sink.
+    Returns an ItemResult per tag, in input order. The caller commits.
+    """
+    now = datetime.utcnow()
+    found = _items_with_open_checkout(asset_tags)
+
+    results = {}
+    candidates = []
+    for tag in asset_tags:
+        item, checkout = found.get(tag, (None, None))
+        if item is None:
+            results[tag] = ItemResult(tag, False, "Unknown asset tag")
+        elif not item.is_loaner:
+            results[tag] = ItemResult(tag, False, "Not a loaner device")
+        elif checkout is not None:
+            results[tag] = ItemResult(tag, False, f"Already checked out to {checkout.borrower_name}")
+        else:
+            candidates.append(item)
+
+    if candidates:
+        statement = _insert(Checkout).values([
+            {'item_id': item.id, 'user_id': user.id, 'borrower_name': borrower_name, 'checkout_date': now}
+            for item in candidates
+        ]).on_conflict_do_nothing(
+            index_elements=['item_id'],
+            index_where=Checkout.return_date.is_(None),
+        ).returning(Checkout.item_id)
+        checked_out = set(db.session.execute(statement).scalars())
+
+        for item in candidates:
+            if item.id in checked_out:
+                results[item.asset_tag] = ItemResult(item.asset_tag, True, f"Checked out to {borrower_name}")
+            else:
+                results[item.asset_tag] = ItemResult(item.asset_tag, False, "Checked out by someone else just now")
+        record_audit(*_audit_events("Device Checkout", user, [item for item in candidates if item.id in checked_out], now))
+
+    return [results[tag] for tag in asset_tags]
+
+
+def check_in_many(asset_tags, user):
+    """Returns every checked-out device among `asset_tags`.
+
+    One query validates all tags, one UPDATE ... WHERE return_date IS NULL
+    RETURNING closes the open checkouts; the log rows go to the audit sink.
+    Returns an ItemResult per tag, in input order. The caller commits.
+    """
+    now = datetime.utcnow()
+    found = _items_with_open_checkout(asset_tags)
+
+    results = {}
+    open_checkouts = {}
+    for tag in asset_tags:
+        item, checkout = found.get(tag, (None, None))
+        if item is None:
+            results[tag] = ItemResult(tag, False, "Unknown asset tag")
+        elif checkout is None:
+            results[tag] = ItemResult(tag, False, "Not checked out")
+        else:
+            open_checkouts[checkout.id] = item
+
+    if open_checkouts:
+        statement = update(Checkout)\
+            .where(Checkout.id.in_(list(open_checkouts)), Checkout.return_date.is_(None))\
+            .values(return_date=now)\
+            .returning(Checkout.id, Checkout.borrower_name)
+        returned = dict(db.session.execute(statement, execution_options={'synchronize_session': False}).all())
+
+        for checkout_id, item in open_checkouts.items():
+            if checkout_id in returned:
+                results[item.asset_tag] = ItemResult(item.asset_tag, True, f"Returned from {returned[checkout_id]}")
+            else:
+                results[item.asset_tag] = ItemResult(item.asset_tag, False, "Returned by someone else just now")
+        returned_items = [item for checkout_id, item in open_checkouts.items() if checkout_id in returned]
+        record_audit(*_audit_events("Device Return", user, returned_items, now))
+
+    return [results[tag] for tag in asset_tags]
@@ -1,4 +1,28 @@
 import os
+from sqlalchemy.pool import NullPool
+
+def engine_options(database_uri):
+    """SQLAlchemy engine options for the database in use, from DB_* environment variables.
+
+    Pool settings are per process: with gunicorn, keep
+    workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) under the server's max_connections
+    (gunicorn.conf.py sizes them from DB_MAX_CONNECTIONS).
+    """
+    if not database_uri.startswith('postgresql'):
+        return {}
+
+    if os.environ.get('DB_PGBOUNCER', '0') == '1':
+        # PgBouncer (transaction pooling) owns the pool
+        return {'poolclass': NullPool, 'pool_pre_ping': False}
+
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        # Azure and most proxies drop idle connections; recycle before they do
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+    }
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your_secret_key'
@@ -11,3 +35,56 @@ class Config:
         SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace('postgres://', 'postgresql://', 1)
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    # Postgres statement timeout for web requests (0: none). Set per transaction, so
+    # migrations, imports, `flask refresh-dashboard` and the job runner are not cut short.
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+    
+    # Seconds the inventory list's dropdown values/counts are cached per worker
+    FACET_CACHE_TTL = int(os.environ.get('FACET_CACHE_TTL', 300))
+    
+    # Rendered-page cache for the read-heavy views, invalidated by per-table version counters.
+    # Leave RESPONSE_CACHE_URL empty for a per-worker LRU, or point it at redis:// to share it.
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '1') == '1'
+    RESPONSE_CACHE_URL = os.environ.get('RESPONSE_CACHE_URL', '')
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 300))
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 512))
+    
+    # Per-worker cache of logged-in users (load_user), invalidated on user edits
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 30))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    
+    # Request instrumentation: Server-Timing header on every response, a query/timing
+    # panel on HTML pages for admins, and statements slower than SLOW_QUERY_MS logged.
+    # /metrics is open to admins, or to anyone sending "Authorization: Bearer <METRICS_TOKEN>".
+    SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', '1') == '1'
+    INSTRUMENTATION_PANEL = os.environ.get('INSTRUMENTATION_PANEL', '0') == '1'
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 500))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    
+    # Audit log (Log rows) sink: 'async' spools committed events to disk and inserts them
+    # in batches from a background thread; 'sync' writes them in the request's transaction.
+    # The spool defaults to <instance>/audit-spool and must survive restarts to replay.
+    AUDIT_SINK = os.environ.get('AUDIT_SINK', 'async')
+    AUDIT_SPOOL_DIR = os.environ.get('AUDIT_SPOOL_DIR', '')
+    AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 500))
+    AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0))
+    AUDIT_SPOOL_FSYNC = os.environ.get('AUDIT_SPOOL_FSYNC', '1') == '1'
+    
+    # Seconds between dashboard summary refreshes by the job runner (0: never; use
+    # `flask refresh-dashboard` from cron instead). A refresh is one small version read
+    # unless inventory or checkouts changed; page views only ever read the summary.
+    DASHBOARD_REFRESH_INTERVAL = int(os.environ.get('DASHBOARD_REFRESH_INTERVAL', 60))
+    
+    # Background jobs (admin CSV imports and queued exports). `flask run-jobs` (started by
+    # startup.sh) runs up to JOBS_WORKERS of them on background threads; JOBS_IN_WEB=1 also
+    # runs them in every web worker, where a recycled worker leaves its jobs to be requeued.
+    # A job whose runner stops renewing its lease for JOBS_STALE_AFTER seconds is requeued,
+    # up to JOBS_MAX_ATTEMPTS claims. Uploads and results live in JOBS_DIR (default
+    # <instance>/jobs), which every web worker and job runner must share.
+    JOBS_IN_WEB = os.environ.get('JOBS_IN_WEB', '0') == '1'
+    JOBS_DIR = os.environ.get('JOBS_DIR', '')
+    JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 1))
+    JOBS_POLL_INTERVAL = float(os.environ.get('JOBS_POLL_INTERVAL', 2.0))
+    JOBS_STALE_AFTER = int(os.environ.get('JOBS_STALE_AFTER', 120))
+    JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', 3))
@@ -0,0 +1,113 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import and_, case, delete, func, insert, literal, select
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Inventory, Checkout, InventorySummary, SummaryRefresh
+from response_cache import table_versions
+
+SUMMARY_NAME = 'inventory_summary'
+SOURCE_TABLES = ('inventory', 'checkout')
+
+# Dashboard dimensions: (name, heading, value expression, extra WHERE conditions)
+DIMENSIONS = (
+    ('asset_type', 'Asset type', Inventory.asset_type, ()),
+    ('category', 'Category', func.coalesce(Inventory.category, ''), ()),
+    ('assignment', 'Assignment', case(
+        (func.coalesce(Inventory.assigned_to, '') == '', literal('Unassigned')),
+        else_=literal('Assigned'),
+    ), ()),
+    ('status', 'Status', case(
+        (Inventory.date_decommissioned.is_(None), literal('Active')),
+        else_=literal('Decommissioned'),
+    ), ()),
+    ('loaners', 'Loaners', case(
+        (Checkout.id.is_(None), literal('Available')),
+        else_=literal('Checked out'),
+    ), (Inventory.is_loaner == True,)),
+)
+
+
+def _summary_select(dimension, value, conditions):
+    statement = select(literal(dimension), Inventory.site_name, value, func.count())
+    if dimension == 'loaners':
+        # At most one open checkout per item (uq_checkout_open_item_id), so the join never multiplies
+        statement = statement.outerjoin(
+            Checkout, and_(Checkout.item_id == Inventory.id, Checkout.return_date.is_(None))
+        )
+    return statement.where(*conditions).group_by(Inventory.site_name, value)
+
+
+def _create_state():
+    """Creates the SummaryRefresh row (the migration seeds it; create_all databases lack it)."""
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(insert(SummaryRefresh.__table__).values(
+                name=SUMMARY_NAME, source_versions={}, refreshed_at=datetime(1970, 1, 1),
+            ))
+    except IntegrityError:
+        pass  # Another runner created it first
+
+
+def refresh_summary(force=False):
+    """Rebuilds inventory_summary if inventory or checkout changed since it was built.
+
+    Run by the job runner every DASHBOARD_REFRESH_INTERVAL seconds and by
+    `flask refresh-dashboard`, never by a page view. The check costs one
+    small read of the table version counters. A rebuild is one INSERT ...
+    SELECT ... GROUP BY per dimension, so it scans the fleet, but only once
+    per interval with writes. Returns True when it rebuilt. Commits.
+    """
+    versions = table_versions(SOURCE_TABLES)
+    state = db.session.get(SummaryRefresh, SUMMARY_NAME)
+    if not force and state is not None and state.source_versions == versions:
+        return False
+    if state is None:
+        _create_state()
+
+    # Runners that find it stale at the same time queue on this row; the losers see it is fresh
+    state = db.session.query(SummaryRefresh).filter_by(name=SUMMARY_NAME)\
+        .with_for_update().populate_existing().one()
+    versions = table_versions(SOURCE_TABLES)
+    if not force and state.source_versions == versions:
+        db.session.commit()
+        return False
+
+    db.session.execute(delete(InventorySummary))
+    summary = InventorySummary.__table__
+    columns = ['dimension', 'site_name', 'value', 'item_count']
+    for dimension, _, value, conditions in DIMENSIONS:
+        db.session.execute(insert(summary).from_select(columns, _summary_select(dimension, value, conditions)))
+
+    state.source_versions = versions
+    state.refreshed_at = datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+def dashboard_data():
+    """Summary rows arranged for the dashboard; reads only inventory_summary."""
+    counts = defaultdict(lambda: defaultdict(dict))  # dimension -> value -> site -> count
+    sites = defaultdict(int)
+    for row in db.session.query(InventorySummary).order_by(InventorySummary.site_name, InventorySummary.value):
+        counts[row.dimension][row.value][row.site_name] = row.item_count
+        if row.dimension == 'asset_type':
+            sites[row.site_name] += row.item_count
+
+    dimensions = []
+    for dimension, heading, _, _ in DIMENSIONS:
+        values = [
+            (value or 'Not set', by_site, sum(by_site.values()))
+            for value, by_site in counts[dimension].items()
+        ]
+        values.sort(key=lambda entry: -entry[2])
+        dimensions.append({'name': dimension, 'heading': heading, 'rows': values})
+
+    state = db.session.get(SummaryRefresh, SUMMARY_NAME)
+    return {
+        'sites': sorted(sites.items()),
+        'total': sum(sites.values()),
+        'dimensions': dimensions,
+        'refreshed_at': state.refreshed_at if state else None,
+    }
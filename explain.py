@@ -0,0 +1,116 @@
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from werkzeug.datastructures import MultiDict
+
+from facets import get_facets, invalidate_facets
+from jobs import next_queued_job_id
+from models import db, Loan, ChangeLog, Log
+from pagination import keyset_paginate
+from queries import (
+    inventory_filters, filtered_inventory_query, inventory_sort_keys, loaner_status_query,
+    loaner_history_query, log_conditions, LOANER_HISTORY_KEYS, LOG_KEYS,
+)
+
+# SQLite: "SCAN inventory" reads the whole table; "SCAN inventory USING INDEX ..." and SEARCH do not
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+# Postgres (with enable_seqscan off, so a Seq Scan means there was no usable index)
+POSTGRES_FULL_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def _inventory_page(**args):
+    filters = inventory_filters(MultiDict(args))
+    inventory_query, rank_key = filtered_inventory_query(filters)
+    keyset_paginate(inventory_query, inventory_sort_keys(filters, rank_key))
+
+
+def _inventory_facets(**args):
+    invalidate_facets()
+    get_facets(inventory_filters(MultiDict(args)), filtered_inventory_query)
+
+
+def _loaner_history(**filters):
+    filters = dict({'item': '', 'borrower': '', 'start': None, 'end': None}, **filters)
+    keyset_paginate(loaner_history_query(filters), LOANER_HISTORY_KEYS, count=False)
+
+
+def _logs(**filters):
+    filters = dict({'action': '', 'user': '', 'start': None, 'end': None}, **filters)
+    keyset_paginate(Log.query.filter(*log_conditions(filters)), LOG_KEYS, count=False)
+
+
+# The app's hot queries, built by the same code the views use
+QUERY_CHECKS = {
+    'inventory list': lambda: _inventory_page(),
+    'inventory by site': lambda: _inventory_page(site_name='x', sort_by='site_name'),
+    'inventory by type': lambda: _inventory_page(asset_type='x'),
+    'inventory by assignee': lambda: _inventory_page(sort_by='assigned_to'),
+    'inventory facets': lambda: _inventory_facets(site_name='x'),
+    'loaner status': lambda: loaner_status_query().all(),
+    'loaner history': lambda: _loaner_history(),
+    'loaner history by item': lambda: _loaner_history(item='x'),
+    'item loans': lambda: Loan.query.filter_by(item_id=0).order_by(Loan.checkout_date.desc()).all(),
+    'item changes': lambda: ChangeLog.query.filter_by(item_id=0).order_by(ChangeLog.timestamp.desc(), ChangeLog.id.desc()).all(),
+    'logs': lambda: _logs(),
+    'logs by action': lambda: _logs(action='x'),
+    'job queue': lambda: next_queued_job_id(db.session.connection()),
+}
+
+
+@contextmanager
+def captured_statements(engine):
+    """Collects the (SQL, parameters) of every statement executed on `engine`."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+
+def explain(connection, statement, parameters):
+    """Returns the plan of one SQL statement as a list of lines."""
+    if connection.dialect.name == 'postgresql':
+        rows = connection.exec_driver_sql('EXPLAIN ' + statement, parameters)
+        return [row[0] for row in rows]
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)
+    return [row[-1] for row in rows]
+
+
+def full_scans(dialect, plan):
+    """Tables the plan reads start to finish without an index."""
+    pattern = POSTGRES_FULL_SCAN if dialect == 'postgresql' else SQLITE_FULL_SCAN
+    tables = set(db.metadata.tables)
+    return sorted({
+        match.group(1) for match in map(pattern.search, (line.strip() for line in plan))
+        # Skip scans of subqueries and CTEs, which have no indexes of their own
+        if match and match.group(1) in tables
+    })
+
+
+def check_query_plans(checks=QUERY_CHECKS):
+    """EXPLAINs every statement each check runs; must run inside an app context.
+
+    Returns {check name: [(SQL, plan lines, fully scanned tables), ...]}.
+    """
+    engine = db.engine
+    report = {}
+    for name, run in checks.items():
+        with captured_statements(engine) as statements:
+            run()
+        db.session.rollback()
+
+        with engine.begin() as connection:
+            if connection.dialect.name == 'postgresql':
+                # Tiny tables make a seq scan cheapest; ask whether an index *could* be used
+                connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+            report[name] = []
+            for statement, parameters in statements:
+                plan = explain(connection, statement, parameters)
+                report[name].append((statement, plan, full_scans(connection.dialect.name, plan)))
+    return report
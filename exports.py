@@ -0,0 +1,125 @@
+import csv
+import io
+import json
+import tempfile
+import zlib
+from datetime import date, datetime
+
+from flask import Response, request, stream_with_context
+
+try:
+    import openpyxl
+except ImportError:  # XLSX export is optional
+    openpyxl = None
+
+# Rows fetched per round trip from the server-side cursor
+STREAM_BATCH_SIZE = 1000
+
+# Bytes per chunk when streaming a finished XLSX file
+FILE_CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+if openpyxl is not None:
+    EXPORT_FORMATS['xlsx'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Formats that are compressed already
+COMPRESSED_FORMATS = frozenset(('xlsx',))
+
+
+def stream_rows(session, statement, batch_size=STREAM_BATCH_SIZE):
+    """Yields result rows of `statement` without loading the whole result.
+
+    yield_per makes SQLAlchemy use a server-side cursor where the driver
+    supports one (psycopg2) and fetch in batches everywhere else.
+    """
+    result = session.execute(statement.execution_options(yield_per=batch_size))
+    try:
+        for partition in result.partitions():
+            yield from partition
+    finally:
+        result.close()
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def csv_lines(fields, rows):
+    """Encodes rows (sequences matching `fields`) as CSV, a buffer's worth at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % STREAM_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_lines(fields, rows):
+    """Encodes rows (sequences matching `fields`) as one JSON object per line."""
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), default=_json_default) + '\n'
+
+
+def xlsx_chunks(fields, rows):
+    """Encodes rows (sequences matching `fields`) as an XLSX workbook.
+
+    The write-only workbook spills rows to a temporary file as they come,
+    so memory stays flat, but a zip can only be sent once it is complete:
+    the first byte goes out after the last row is read.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(fields)
+    for row in rows:
+        sheet.append(list(row))
+    with tempfile.TemporaryFile() as xlsx_file:
+        workbook.save(xlsx_file)
+        xlsx_file.seek(0)
+        while chunk := xlsx_file.read(FILE_CHUNK_SIZE):
+            yield chunk
+
+
+def encode_rows(export_format, fields, rows):
+    if export_format == 'ndjson':
+        return ndjson_lines(fields, rows)
+    if export_format == 'xlsx':
+        return xlsx_chunks(fields, rows)
+    return csv_lines(fields, rows)
+
+
+def gzip_chunks(chunks):
+    """Gzips a stream of str/bytes chunks on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(export_format, fields, rows, filename):
+    """A streamed download of `rows`, gzipped in flight when the client accepts it.
+
+    Call with a supported `export_format` from inside a request; `rows` is
+    only consumed while the response body is sent.
+    """
+    body = encode_rows(export_format, fields, rows)
+    gzipped = export_format not in COMPRESSED_FORMATS and 'gzip' in request.accept_encodings
+    if gzipped:
+        body = gzip_chunks(body)
+
+    response = Response(stream_with_context(body), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{export_format}'
+    response.vary.add('Accept-Encoding')
+    if gzipped:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
@@ -0,0 +1,63 @@
+from flask import current_app
+from sqlalchemy import func
+
+from caching import TTLCache
+from models import Inventory
+
+# Dropdown facets on the inventory list, keyed by filter name
+FACET_COLUMNS = {
+    'asset_type': Inventory.asset_type,
+    'site_name': Inventory.site_name,
+}
+
+# Filters that change which rows are counted (sorting does not)
+FILTER_FIELDS = ('query', 'asset_type', 'site_name', 'assigned_to')
+
+_cache = TTLCache(maxsize=512, ttl=300)
+
+
+def invalidate_facets():
+    """Drops all cached facet values; call after any inventory write.
+
+    The cache is per process, so writes made elsewhere (another worker, the
+    CSV importer) show up once FACET_CACHE_TTL expires.
+    """
+    _cache.clear()
+
+
+def facet_cache_stats():
+    return _cache.stats()
+
+
+def _counts(column, filters, build_query):
+    query, _ = build_query(filters)
+    rows = query.with_entities(column, func.count()) \
+        .filter(column.isnot(None), column != '') \
+        .group_by(column).order_by(column).all()
+    return dict(rows)
+
+
+def get_facets(filters, build_query):
+    """Returns {facet: [(value, count), ...]} for the inventory list dropdowns.
+
+    Every value in the table is listed; counts reflect the active filters
+    except the facet's own, so picking a site still shows how many items of
+    each type that site has. Results are cached until inventory is written.
+    `build_query(filters)` must return (query, rank_key) like
+    queries.filtered_inventory_query().
+    """
+    _cache.ttl = current_app.config.get('FACET_CACHE_TTL', _cache.ttl)
+    unfiltered = dict.fromkeys(FILTER_FIELDS, '')
+
+    facets = {}
+    for name, column in FACET_COLUMNS.items():
+        others = {field: filters.get(field, '') for field in FILTER_FIELDS if field != name}
+        others[name] = ''
+        every = _cache.get_or_set((name,), lambda: _counts(column, unfiltered, build_query))
+        if any(others.values()):
+            key = (name,) + tuple(sorted(others.items()))
+            counts = _cache.get_or_set(key, lambda: _counts(column, others, build_query))
+        else:
+            counts = every
+        facets[name] = [(value, counts.get(value, 0)) for value in every]
+    return facets
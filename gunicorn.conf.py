@@ -0,0 +1,62 @@
+# Gunicorn settings; every value can be overridden from the environment.
+#
+# Workers are processes (CPU-bound work such as template rendering runs in
+# parallel), threads serve concurrent requests inside a worker while others
+# wait on the database. Each thread may hold one pooled connection, so every
+# worker's pool is sized to its request threads plus its background threads,
+# and the total, with the `flask run-jobs` process, is kept within
+# DB_MAX_CONNECTIONS (Postgres max_connections minus headroom for migrations,
+# psql and the importer).
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so a slow leak cannot grow without bound
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+
+# Connections the whole app may open, across all workers
+db_max_connections = int(os.environ.get('DB_MAX_CONNECTIONS', 50))
+
+# A job runner holds up to two connections per job thread (the job's session and its
+# progress report) plus one for its heartbeat thread and one for its audit writer;
+# startup.sh gives `flask run-jobs` a pool of that size
+jobs_in_web = os.environ.get('JOBS_IN_WEB', '0') == '1'
+runner_connections = int(os.environ.get('JOBS_WORKERS', 1)) * 2 + 2
+# Background threads of each worker: the audit writer, and a whole job runner with JOBS_IN_WEB
+background_connections = runner_connections if jobs_in_web else 1
+web_budget = db_max_connections if jobs_in_web else db_max_connections - runner_connections
+
+# Pool per worker: a connection per thread, plus overflow out of whatever budget is left.
+# Workers import the app (and read these) after the fork, since preload_app is off.
+os.environ.setdefault('DB_POOL_SIZE', str(threads + background_connections))
+os.environ.setdefault(
+    'DB_MAX_OVERFLOW',
+    str(max(web_budget // workers - int(os.environ['DB_POOL_SIZE']), 0)),
+)
+
+
+def on_starting(server):
+    per_worker = int(os.environ['DB_POOL_SIZE']) + int(os.environ['DB_MAX_OVERFLOW'])
+    total = workers * per_worker + (0 if jobs_in_web else runner_connections)
+    if os.environ.get('DB_PGBOUNCER', '0') == '1':
+        server.log.info("PgBouncer mode: connections are pooled by PgBouncer, not per worker")
+    elif total > db_max_connections:
+        server.log.warning(
+            "%d workers x %d connections (+%d for the job runner) exceeds DB_MAX_CONNECTIONS=%d",
+            workers, per_worker, 0 if jobs_in_web else runner_connections, db_max_connections,
+        )
+    else:
+        server.log.info(
+            "%d workers x %d threads; up to %d database connections per worker (%d of %d with the job runner)",
+            workers, threads, per_worker, total, db_max_connections,
+        )
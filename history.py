@@ -0,0 +1,118 @@
+from datetime import date, datetime
+from types import SimpleNamespace
+
+from sqlalchemy.orm import joinedload
+
+from models import db, Inventory, ChangeLog
+
+# Inventory fields whose changes are recorded; ChangeLog.changes maps each changed one to [old, new]
+TRACKED_FIELDS = tuple(column.key for column in Inventory.__table__.columns if column.key not in ('id', 'import_hash'))
+DATE_FIELDS = frozenset(
+    column.key for column in Inventory.__table__.columns if isinstance(column.type, db.Date)
+)
+
+# change_description is a String(255)
+DESCRIPTION_LENGTH = 255
+
+
+def _blank_to_none(value):
+    # Forms submit '' for fields the database holds as NULL; that is not a change
+    return None if value == '' else value
+
+
+def _to_json(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def _from_json(field, value):
+    return date.fromisoformat(value) if field in DATE_FIELDS and value else value
+
+
+def item_diff(item, values):
+    """{field: [old, new]} for each of `values` that differs from `item` (a model or row), JSON-ready."""
+    diff = {}
+    for field, new in values.items():
+        old = getattr(item, field)
+        if _blank_to_none(old) != _blank_to_none(new):
+            diff[field] = [_to_json(old), _to_json(new)]
+    return diff
+
+
+def describe_changes(diff, username, via=''):
+    fields = ', '.join(field.replace('_', ' ') for field in diff)
+    description = f"{fields} updated{via} by {username}"
+    if len(description) > DESCRIPTION_LENGTH:
+        description = f"{len(diff)} fields updated{via} by {username}"
+    return description[:DESCRIPTION_LENGTH]
+
+
+def change_values(item_id, diff, user=None, via='', timestamp=None):
+    """Column values for a ChangeLog row, for bulk writes; `user` is None for a command-line import."""
+    return {
+        'item_id': item_id,
+        'user_id': user.id if user else None,
+        'timestamp': timestamp or datetime.utcnow(),
+        'change_description': describe_changes(diff, user.username if user else 'import', via=via if user else ''),
+        'changes': diff,
+    }
+
+
+def import_change(item, record, user=None, timestamp=None):
+    """ChangeLog values for an import upsert overwriting `item` (a row) with `record`, or None if nothing changes.
+
+    A record without a serial keeps the stored one, as the upsert does.
+    """
+    values = {field: record[field] for field in TRACKED_FIELDS if field in record}
+    if values.get('serial_number') is None:
+        values.pop('serial_number', None)
+    diff = item_diff(item, values)
+    return change_values(item.id, diff, user, via=' via import', timestamp=timestamp) if diff else None
+
+
+def update_item(item, values, user):
+    """Applies `values` to a loaded item and logs what changed; returns the ChangeLog, or None.
+
+    Only fields whose value really differs are assigned, so the flush
+    UPDATEs just those columns, and an edit that changes nothing writes
+    nothing at all. The caller commits.
+    """
+    diff = item_diff(item, values)
+    if not diff:
+        return None
+    for field in diff:
+        setattr(item, field, values[field])
+    change = ChangeLog(
+        item_id=item.id,
+        user_id=user.id,
+        timestamp=datetime.utcnow(),
+        change_description=describe_changes(diff, user.username),
+        changes=diff,
+    )
+    db.session.add(change)
+    return change
+
+
+def item_history(item):
+    """The item's changes, newest first, each paired with the item as it was right after it.
+
+    One indexed query reads the deltas; versions are rebuilt by walking back
+    from the current row, undoing one change at a time. That needs every
+    write to log its delta: app edits, API updates and imports (upserts and
+    decommissions) all do. Changes logged before deltas were kept have no
+    snapshot, nor does anything older.
+    """
+    changes = ChangeLog.query.options(joinedload(ChangeLog.user))\
+        .filter_by(item_id=item.id)\
+        .order_by(ChangeLog.timestamp.desc(), ChangeLog.id.desc())\
+        .all()
+
+    state = {field: getattr(item, field) for field in TRACKED_FIELDS}
+    history = []
+    for change in changes:
+        history.append((change, SimpleNamespace(id=item.id, **state) if state is not None else None))
+        if change.changes is None:
+            state = None
+        elif state is not None:
+            for field, (old, new) in change.changes.items():
+                state[field] = _from_json(field, old)
+    return history
@@ -1,106 +1,264 @@
-import csv
-import time
-from datetime import datetime
-from models import db, Inventory
+import argparse
+import os
+from datetime import date, datetime
+from itertools import count, islice
+from sqlalchemy import Column, MetaData, String, Table, exists, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Inventory, ChangeLog
+from facets import invalidate_facets
+from history import change_values, import_change
+from import_parser import IMPORT_COLUMNS, RejectsFile, parse_chunks
+from serials import placeholder_serials
 from app import app
 
 # CSV file name
 CSV_FILE = "Cleaned_Inventory_Data.csv"
 
-def clean_value(value, default="Unknown"):
-    """Returns a cleaned value or a default if empty."""
-    return value.strip() if value and value.strip() else default
-
-def generate_unique_serial():
-    """Creates a truly unique serial number using a timestamp."""
-    return f"SN-{int(time.time() * 1000)}"  # Milliseconds to ensure uniqueness
-
-def parse_date(date_str):
-    """Parses a date string into a date object, returns None if invalid."""
-    if date_str.strip():
-        try:
-            return datetime.strptime(date_str, "%Y-%m-%d").date()
-        except ValueError:
-            print(f"⚠️ Invalid date: {date_str} - Defaulting to None")
-            return None
-    return None
-
-def ensure_unique_serial(serial_number):
-    """Ensures the generated serial number does not exist in the database."""
-    while Inventory.query.filter_by(serial_number=serial_number).first():
-        serial_number = generate_unique_serial()
-    return serial_number
-
-def import_inventory():
+# Rows read, prefetched, written and committed together
+DEFAULT_BATCH_SIZE = 500
+
+class ImportStats:
+    """Running totals for an import, handed to the progress callback after every batch."""
+
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.decommissioned = 0
+        self.placeholder_serials = 0
+        self.batches = 0
+        self.rejected = 0
+
+    def __str__(self):
+        return (f"{self.rows} rows: {self.inserted} inserted, {self.updated} updated, "
+                f"{self.unchanged} unchanged, {self.decommissioned} decommissioned, "
+                f"{self.placeholder_serials} placeholder serials, {self.rejected} rejected")
+
+def upsert_statement():
+    """INSERT ... ON CONFLICT (asset_tag) DO UPDATE for the active database.
+
+    A NULL serial in the incoming row keeps whatever serial the asset already has.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        insert = postgresql.insert
+    elif dialect == 'sqlite':
+        insert = sqlite.insert
+    else:
+        raise RuntimeError(f"Bulk import is not supported on {dialect}")
+
+    statement = insert(Inventory.__table__)
+    updates = {
+        column: statement.excluded[column]
+        for column in IMPORT_COLUMNS if column not in ('asset_tag', 'serial_number')
+    }
+    updates['serial_number'] = func.coalesce(statement.excluded.serial_number, Inventory.__table__.c.serial_number)
+    updates['import_hash'] = statement.excluded.import_hash
+    return statement.on_conflict_do_update(index_elements=['asset_tag'], set_=updates)
+
+def resolve_batch(records, seen_tags, claimed_serials, stats, allocate_serial=placeholder_serials.allocate,
+                  delta=False, changes=None, user=None):
+    """Prefetches the batch's existing rows/serials and settles every serial in memory.
+
+    Returns the records to write. `seen_tags` holds the asset tags written
+    earlier in this import and `claimed_serials` maps the serials they took
+    to their asset tag, so batches agree even when nothing is committed.
+    With `delta`, rows whose import_hash matches the stored one are counted
+    as unchanged and left out. If a `changes` dict is given, it is filled
+    with asset tag -> ChangeLog values for every existing asset the records
+    modify, to be inserted with them so item history stays complete.
+    """
+    # Later rows for the same asset tag win, as if each row were applied in turn
+    by_tag = {}
+    for _, record in records:
+        by_tag[record['asset_tag']] = record
+
+    existing = {
+        row.asset_tag: row
+        for row in db.session.execute(select(Inventory.__table__).where(Inventory.asset_tag.in_(list(by_tag))))
+    }
+    existing_tags = existing.keys() | (by_tag.keys() & seen_tags)
+    if delta:
+        unchanged = {
+            tag for tag, record in by_tag.items()
+            if tag not in seen_tags and tag in existing and existing[tag].import_hash == record['import_hash']
+        }
+        stats.unchanged += len(unchanged)
+        seen_tags.update(unchanged)
+        for tag in unchanged:
+            del by_tag[tag]
+        existing_tags -= unchanged
+    records = list(by_tag.values())
+    serials = [record['serial_number'] for record in records if record['serial_number']]
+    serial_owners = dict(
+        db.session.query(Inventory.serial_number, Inventory.asset_tag)
+        .filter(Inventory.serial_number.in_(serials))
+    ) if serials else {}
+
+    for record in records:
+        tag = record['asset_tag']
+        serial = record['serial_number']
+        owner = claimed_serials.get(serial) or serial_owners.get(serial)
+        if serial and owner not in (None, tag):
+            # Serial belongs to a different asset; treat it as missing
+            serial = None
+        if serial is None and tag not in existing_tags:
+            serial = allocate_serial()
+            stats.placeholder_serials += 1
+        if serial:
+            claimed_serials[serial] = tag
+        record['serial_number'] = serial
+
+    if changes is not None:
+        now = datetime.utcnow()
+        for record in records:
+            row = existing.get(record['asset_tag'])
+            change = import_change(row, record, user, now) if row is not None else None
+            if change:
+                changes[record['asset_tag']] = change
+
+    stats.inserted += len(by_tag.keys() - existing_tags)
+    stats.updated += len(existing_tags)
+    seen_tags.update(by_tag)
+    return records
+
+def decommission_missing(seen_tags, dry_run=False, user=None):
+    """Marks imported assets that are not in `seen_tags` as decommissioned today; returns how many.
+
+    Only rows that came from an import (import_hash set) and are still
+    active are touched; items added in the app are not the source's to
+    retire. The tags go to a temporary table, so the UPDATE is one
+    anti-join whatever the file size. Each one gets a ChangeLog entry.
+    Commits.
+    """
+    seen = Table(
+        'import_seen_tags', MetaData(), Column('asset_tag', String(50), primary_key=True),
+        prefixes=['TEMPORARY'],
+    )
+    inventory = Inventory.__table__
+    connection = db.session.connection()
+    seen.create(connection)
+    try:
+        tags = iter(seen_tags)
+        while chunk := list(islice(tags, DEFAULT_BATCH_SIZE)):
+            connection.execute(seen.insert(), [{'asset_tag': tag} for tag in chunk])
+
+        missing = [
+            inventory.c.import_hash.is_not(None),
+            inventory.c.date_decommissioned.is_(None),
+            ~exists().where(seen.c.asset_tag == inventory.c.asset_tag),
+        ]
+        if dry_run:
+            decommissioned = connection.execute(select(func.count()).select_from(inventory).where(*missing)).scalar()
+        else:
+            # Dropping the hash means the asset is rewritten (and reactivated) if it reappears in the source
+            today = date.today()
+            statement = update(Inventory).where(*missing).values(date_decommissioned=today, import_hash=None)\
+                .returning(Inventory.id)
+            item_ids = db.session.execute(statement, execution_options={'synchronize_session': False}).scalars().all()
+            diff = {'date_decommissioned': [None, today.isoformat()]}
+            if item_ids:
+                db.session.execute(ChangeLog.__table__.insert(), [
+                    change_values(item_id, diff, user, via=' via import') for item_id in item_ids
+                ])
+            decommissioned = len(item_ids)
+    finally:
+        seen.drop(connection)
+    db.session.commit()
+    return decommissioned
+
+def import_rows(csvfile, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, progress=None, delta=False,
+                decommission=False, source='', user=None, rejects=None):
+    """Writes the rows of an open CSV file into the inventory table in committed batches.
+
+    Must run inside an app context. The file is streamed through
+    import_parser.parse_chunks(), a chunk at a time, so `csvfile` must be
+    seekable. The rows it rejects are counted in stats.rejected and written
+    to `rejects` (an import_parser.RejectsFile) if given, and stats.rows
+    counts the rest. With dry_run the rows are cleaned and checked against
+    the database but nothing is written. With delta, rows identical to the
+    last import of that asset are skipped without a write (so edits made in
+    the app since then also stand). With decommission, imported assets
+    missing from this file are marked decommissioned; the file must then be
+    the complete source, and an empty one is refused. An asset whose row
+    was rejected is still in the source, so it is left as it is. Changes to existing assets are logged in ChangeLog,
+    under `user` (None from the command line).
+    """
+    stats = ImportStats()
+    statement = None if dry_run else upsert_statement()
+    seen_tags = set()
+    # Tags of rejected rows: not written, but present in the source, so never decommissioned
+    rejected_tags = set()
+    claimed_serials = {}
+    # A dry run must not reserve counter blocks, so it numbers placeholders locally
+    dry_run_serials = count(1)
+    allocate_serial = (lambda: f"SN-DRY-RUN-{next(dry_run_serials)}") if dry_run else placeholder_serials.allocate
+
+    def parsed_rows():
+        for parsed in parse_chunks(csvfile, source=source):
+            stats.rejected += len({reject.row for reject in parsed.rejects})
+            rejected_tags.update(reject.asset_tag for reject in parsed.rejects)
+            if rejects is not None:
+                rejects.write(parsed.rejects)
+            yield from zip(parsed.rows, parsed.records)
+
+    pending = parsed_rows()
+    while batch := list(islice(pending, batch_size)):
+        changes = None if dry_run else {}
+        records = resolve_batch(batch, seen_tags, claimed_serials, stats, allocate_serial, delta=delta,
+                                changes=changes, user=user)
+        if records and not dry_run:
+            db.session.execute(statement, records)
+            if changes:
+                db.session.execute(ChangeLog.__table__.insert(), list(changes.values()))
+            db.session.commit()
+        stats.rows += len(batch)
+        stats.batches += 1
+        if progress:
+            progress(stats)
+
+    if decommission:
+        if not stats.rows:
+            raise ValueError("Refusing to decommission every imported asset: the file has no rows")
+        stats.decommissioned = decommission_missing(seen_tags | rejected_tags, dry_run=dry_run, user=user)
+
+    if not dry_run:
+        invalidate_facets()
+    return stats
+
+def print_progress(stats):
+    print(f"⏳ {stats}")
+
+def import_inventory(csv_file=CSV_FILE, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, progress=print_progress,
+                     delta=False, decommission=False, rejects_file=None):
     with app.app_context():  # Ensure Flask context is active
-        print("✅ Connecting to inventory.db...")
+        print(f"✅ Connecting to {db.engine.url.render_as_string(hide_password=True)}...")
 
         # Open CSV file
-        with open(CSV_FILE, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            counter = 1  # Counter for missing asset tags
-
-            for row in reader:
-                # Clean and retrieve data
-                asset_tag = clean_value(row['asset_tag'], f"UNKNOWN-{counter}")
-                site_name = clean_value(row['site_name'])
-                room_number = clean_value(row['room_number'], "N/A")
-                room_name = clean_value(row['room_name'])
-                asset_type = clean_value(row['asset_type'])
-                model = clean_value(row['model'])
-                notes = clean_value(row['notes'], "No Notes")
-                assigned_to = clean_value(row['assigned_to'], "Unassigned")
-                date_assigned = parse_date(row['date_assigned'])
-                date_decommissioned = parse_date(row['date_decommissioned'])
-
-                # Check if serial number exists, if not generate a new one
-                serial_number = clean_value(row['serial_number'])
-                if serial_number == "Unknown":
-                    serial_number = generate_unique_serial()
-                
-                serial_number = ensure_unique_serial(serial_number)  # Make sure it's unique
-
-                # Check if the item already exists (using asset_tag)
-                existing_item = Inventory.query.filter_by(asset_tag=asset_tag).first()
-
-                if existing_item:
-                    # 🔄 Update the existing record
-                    existing_item.site_name = site_name
-                    existing_item.room_number = room_number
-                    existing_item.room_name = room_name
-                    existing_item.asset_type = asset_type
-                    existing_item.model = model
-                    existing_item.serial_number = ensure_unique_serial(serial_number)  # Ensure uniqueness
-                    existing_item.notes = notes
-                    existing_item.assigned_to = assigned_to
-                    existing_item.date_assigned = date_assigned
-                    existing_item.date_decommissioned = date_decommissioned
-                    print(f"🔄 Updated existing asset: {asset_tag}")
-
-                else:
-                    # 🆕 Insert a new record
-                    new_item = Inventory(
-                        site_name=site_name,
-                        room_number=room_number,
-                        room_name=room_name,
-                        asset_tag=asset_tag,
-                        asset_type=asset_type,
-                        model=model,
-                        serial_number=ensure_unique_serial(serial_number),  # Ensure uniqueness
-                        notes=notes,
-                        assigned_to=assigned_to,
-                        date_assigned=date_assigned,
-                        date_decommissioned=date_decommissioned
-                    )
-                    db.session.add(new_item)
-                    print(f"✅ Inserted new asset: {asset_tag}")
-
-                counter += 1  # Increment counter for missing asset tags
-
-        # Commit all changes to the database
-        db.session.commit()
-        print("✅ Inventory data successfully imported.")
+        rejects = RejectsFile(rejects_file or f"{os.path.splitext(csv_file)[0]}.rejects.csv")
+        with open(csv_file, newline='', encoding='utf-8') as csvfile, rejects:
+            stats = import_rows(csvfile, batch_size=batch_size, dry_run=dry_run, progress=progress, delta=delta,
+                                decommission=decommission, source=os.path.basename(csv_file), rejects=rejects)
+
+        if dry_run:
+            print(f"✅ Dry run complete, nothing written: {stats}")
+        else:
+            print(f"✅ Inventory data successfully imported: {stats}")
+        if stats.rejected:
+            print(f"⚠️ {stats.rejected} rows rejected, see {rejects.path}")
+        return stats
 
 # Run the import script
 if __name__ == "__main__":
-    import_inventory()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Import inventory from a CSV export.")
+    parser.add_argument("csv_file", nargs="?", default=CSV_FILE, help=f"CSV file to import (default: {CSV_FILE})")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows per batch/commit")
+    parser.add_argument("--dry-run", action="store_true", help="validate the file against the database without writing")
+    parser.add_argument("--delta", action="store_true", help="skip rows unchanged since they were last imported")
+    parser.add_argument("--decommission-missing", action="store_true",
+                        help="mark imported assets absent from this (complete) file as decommissioned")
+    parser.add_argument("--rejects", help="where to write rejected rows (default: <csv_file>.rejects.csv)")
+    args = parser.parse_args()
+    import_inventory(args.csv_file, batch_size=args.batch_size, dry_run=args.dry_run,
+                     delta=args.delta, decommission=args.decommission_missing, rejects_file=args.rejects)
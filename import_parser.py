@@ -0,0 +1,258 @@
+import csv
+import hashlib
+import os
+from collections import defaultdict, namedtuple
+from datetime import date, datetime
+from itertools import islice
+from operator import itemgetter
+
+# Columns written by the importer (is_loaner and category are managed in the app)
+IMPORT_COLUMNS = (
+    'site_name', 'room_number', 'room_name', 'asset_tag', 'asset_type', 'model',
+    'serial_number', 'notes', 'assigned_to', 'date_assigned', 'date_decommissioned',
+)
+DATE_COLUMNS = ('date_assigned', 'date_decommissioned')
+
+# What a blank cell becomes; asset_tag, serial_number and the dates are handled separately
+TEXT_DEFAULTS = {
+    'site_name': "Unknown",
+    'room_number': "N/A",
+    'room_name': "Unknown",
+    'asset_type': "Unknown",
+    'model': "Unknown",
+    'notes': "No Notes",
+    'assigned_to': "Unassigned",
+}
+
+# Accepted after ISO dates, in order; slashed dates are US month/day
+DATE_FORMATS = ('%m/%d/%Y', '%m/%d/%y', '%Y/%m/%d', '%d-%b-%Y', '%d %b %Y', '%b %d, %Y')
+
+# Rows turned into columns at a time; the row lists are dropped after each chunk
+CHUNK_ROWS = 10_000
+
+REJECT_FIELDS = ('source', 'row', 'asset_tag', 'column', 'value', 'reason')
+
+# A row left out of the import (or one problem with it); `row` counts data rows, 1 being the first after the header
+Reject = namedtuple('Reject', REJECT_FIELDS)
+
+# One chunk's cleaned records in file order, their row numbers, and what it left out
+ParsedRows = namedtuple('ParsedRows', 'records rows rejects')
+
+# What parse_file() sends back from a worker process: (row number, record) pairs and rejects, or the error
+ParsedFile = namedtuple('ParsedFile', 'path records rejects error')
+
+_INVALID = object()
+
+
+def row_hashes(columns):
+    """Digest of each row's cleaned IMPORT_COLUMNS values, stored as Inventory.import_hash."""
+    text = [
+        ['' if value is None else str(value) for value in columns[column]] if column in DATE_COLUMNS + ('serial_number',)
+        else columns[column]
+        for column in IMPORT_COLUMNS
+    ]
+    blake2b = hashlib.blake2b
+    return [blake2b('\x1f'.join(values).encode('utf-8'), digest_size=16).hexdigest() for values in zip(*text)]
+
+
+def squeeze(values, default='', cache=None):
+    """Strips each value and collapses inner runs of whitespace ("Susan  McMillan" -> "Susan McMillan").
+
+    Blank values become `default`. Each distinct value is cleaned once (once
+    per `cache`, if one is passed); most columns repeat a handful of sites,
+    rooms, models and people.
+    """
+    cache = {} if cache is None else cache
+    for value in set(values).difference(cache):
+        cache[value] = ' '.join(value.split()) or default
+    return list(map(cache.__getitem__, values))
+
+
+def _parse_date(text):
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    return _INVALID
+
+
+def parse_dates(values, cache=None):
+    """Parses a column of date strings; returns (dates, indexes of unparseable values).
+
+    Each distinct value is parsed once (once per `cache`), so a column of a
+    few hundred distinct dates costs a few hundred parses however long it
+    is. Blank cells are None.
+    """
+    cache = {} if cache is None else cache
+    for value in set(values).difference(cache):
+        text = value.strip()
+        cache[value] = _parse_date(text) if text else None
+    dates = list(map(cache.__getitem__, values))
+    invalid = [index for index, value in enumerate(dates) if value is _INVALID]
+    return dates, invalid
+
+
+def _clean_tags(tags, first_row, tag_prefix):
+    # Tags are nearly all distinct, so caching by value would not pay
+    return [
+        ' '.join(tag.split()) or f"UNKNOWN-{tag_prefix}{number}" for number, tag in enumerate(tags, first_row)
+    ]
+
+
+def _clean_chunk(rows, positions, first_row, tag_prefix, caches):
+    """Cleans a chunk of csv.reader rows a column at a time; returns (columns, {index: [(column, bad date)]})."""
+    raw = {column: list(map(itemgetter(position), rows)) for column, position in positions.items()}
+
+    columns = {
+        column: squeeze(raw[column], default, caches[column])
+        for column, default in TEXT_DEFAULTS.items() if column != 'notes'
+    }
+    # Notes keep their line breaks; only the ends are trimmed
+    columns['notes'] = [value.strip() or TEXT_DEFAULTS['notes'] for value in raw['notes']]
+    columns['asset_tag'] = _clean_tags(raw['asset_tag'], first_row, tag_prefix)
+    serials = (' '.join(serial.split()) for serial in raw['serial_number'])
+    columns['serial_number'] = [None if serial in ('', "Unknown") else serial for serial in serials]
+
+    bad_dates = defaultdict(list)
+    for column in DATE_COLUMNS:
+        columns[column], invalid = parse_dates(raw[column], caches['dates'])
+        for index in invalid:
+            bad_dates[index].append((column, raw[column][index]))
+    return columns, bad_dates
+
+
+def _data_rows(csvfile):
+    """Rewinds `csvfile`; returns ({column: position}, its data rows as lists) for a file in the Cleaned_Inventory_Data.csv layout."""
+    csvfile.seek(0)
+    reader = csv.reader(csvfile)
+    fieldnames = next(reader, [])
+    missing = [column for column in IMPORT_COLUMNS if column not in fieldnames]
+    if missing:
+        raise ValueError(f"missing columns: {', '.join(missing)}")
+    positions = {column: fieldnames.index(column) for column in IMPORT_COLUMNS}
+    width = len(fieldnames)
+    # Blank lines are skipped and short rows padded, as csv.DictReader would
+    return positions, (row if len(row) >= width else row + [''] * (width - len(row)) for row in reader if row)
+
+
+def last_rows(csvfile, tag_prefix=''):
+    """Maps each asset tag in `csvfile` to the number of its last row with parseable dates.
+
+    The cheap first pass of parse_chunks(): only the tag and date columns
+    are cleaned, and nothing but this map is kept.
+    """
+    positions, rows = _data_rows(csvfile)
+    tag_position = positions['asset_tag']
+    date_positions = [positions[column] for column in DATE_COLUMNS]
+    cache = {}
+    last = {}
+    first_row = 1
+    while chunk := list(islice(rows, CHUNK_ROWS)):
+        invalid = set()
+        for position in date_positions:
+            invalid.update(parse_dates(list(map(itemgetter(position), chunk)), cache)[1])
+        tags = _clean_tags(list(map(itemgetter(tag_position), chunk)), first_row, tag_prefix)
+        for index, tag in enumerate(tags):
+            if index not in invalid:
+                last[tag] = first_row + index
+        first_row += len(chunk)
+    return last
+
+
+def parse_chunks(csvfile, source='', tag_prefix=''):
+    """Reads a CSV file in the Cleaned_Inventory_Data.csv layout; yields ParsedRows for every CHUNK_ROWS rows.
+
+    The file is read twice: last_rows() first finds the row each asset tag
+    keeps, then rows are cleaned a column at a time, one chunk in memory at
+    a time. Rows with an unparseable date are rejected rather than imported
+    with the date dropped. When an asset tag repeats, the last row wins, as
+    it would if each row were applied in turn; the earlier ones are rejected
+    as duplicates, with the chunk of the row that supersedes them. Blank
+    asset tags become UNKNOWN-<tag_prefix><row>. Raises ValueError when a
+    column is missing, before anything is yielded.
+    """
+    last = last_rows(csvfile, tag_prefix)
+    positions, rows = _data_rows(csvfile)
+    fields = IMPORT_COLUMNS + ('import_hash',)
+    caches = defaultdict(dict)
+    # Winning row number -> (row number, hash) of the rows it supersedes, until the winner's hash is known
+    superseded = defaultdict(list)
+    first_row = 1
+    while chunk := list(islice(rows, CHUNK_ROWS)):
+        columns, bad_dates = _clean_chunk(chunk, positions, first_row, tag_prefix, caches)
+        columns['import_hash'] = hashes = row_hashes(columns)
+        records, numbers, rejects = [], [], []
+        for index, values in enumerate(zip(*(columns[field] for field in fields))):
+            number, tag = first_row + index, columns['asset_tag'][index]
+            if index in bad_dates:
+                for column, value in bad_dates[index]:
+                    rejects.append(Reject(source, number, tag, column, value, "unrecognised date"))
+            elif last[tag] != number:
+                superseded[last[tag]].append((number, hashes[index]))
+            else:
+                records.append(dict(zip(fields, values)))
+                numbers.append(number)
+                for row, row_hash in superseded.pop(number, ()):
+                    reason = f"{'duplicate of' if row_hash == hashes[index] else 'superseded by'} row {number}"
+                    rejects.append(Reject(source, row, tag, 'asset_tag', tag, reason))
+        rejects.sort(key=lambda reject: reject.row)
+        yield ParsedRows(records, numbers, rejects)
+        first_row += len(chunk)
+
+
+def parse_file(path):
+    """Reads and cleans one CSV with parse_chunks(), e.g. in a worker process; returns a ParsedFile.
+
+    This module does not import the app, so worker processes stay light.
+    Blank asset tags become UNKNOWN-<file>-<row>, so two files' placeholder
+    tags never merge into one asset. Any error fails just this file.
+    """
+    file_name = os.path.basename(path)
+    records, rejects = [], []
+    try:
+        with open(path, newline='', encoding='utf-8') as csvfile:
+            for parsed in parse_chunks(csvfile, source=file_name, tag_prefix=f"{os.path.splitext(file_name)[0]}-"):
+                records.extend(zip(parsed.rows, parsed.records))
+                rejects.extend(parsed.rejects)
+    except (OSError, UnicodeDecodeError, ValueError, csv.Error) as e:
+        return ParsedFile(path, [], [], str(e))
+    return ParsedFile(path, records, rejects, None)
+
+
+class RejectsFile:
+    """A CSV with REJECT_FIELDS columns that rejects are appended to as they are found.
+
+    The file is only created by the first write, so an import without
+    rejects leaves none behind.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.written = 0
+        self._file = None
+        self._writer = None
+
+    def write(self, rejects):
+        if not rejects:
+            return
+        if self._file is None:
+            self._file = open(self.path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(REJECT_FIELDS)
+        self._writer.writerows(rejects)
+        self.written += len(rejects)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
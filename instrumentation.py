@@ -0,0 +1,262 @@
+import heapq
+import logging
+import threading
+import time
+from collections import Counter
+
+from flask import (
+    before_render_template, current_app, g, has_app_context, has_request_context, render_template, request,
+    template_rendered,
+)
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Slowest statements kept per request for the admin panel
+SLOWEST_KEPT = 5
+
+# Prometheus histogram buckets
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+class RequestStats:
+    """SQL and template timings of the current request, kept on flask.g."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self.render_started = None
+        self.slowest = []  # min-heap of (seconds, sequence, statement)
+        self.statements = Counter()
+
+    def record_query(self, statement, seconds):
+        self.queries += 1
+        self.db_seconds += seconds
+        self.statements[statement] += 1
+        entry = (seconds, self.queries, statement)
+        if len(self.slowest) < SLOWEST_KEPT:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+
+    def slowest_statements(self):
+        return [(seconds, statement) for seconds, _, statement in sorted(self.slowest, reverse=True)]
+
+    def repeated_statements(self):
+        """Statements run more than once: the usual sign of an N+1 loop."""
+        return [(count, statement) for statement, count in self.statements.most_common() if count > 1]
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+def _labels(**labels):
+    return ','.join(f'{key}="{str(value)}"'.replace('\n', ' ') for key, value in labels.items())
+
+
+class Metrics:
+    """Per-process request metrics, rendered in the Prometheus text format.
+
+    Each gunicorn worker keeps its own, so a scrape only reports the worker
+    that answered it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter()
+        self.slow_queries = 0
+        self.histograms = {
+            'inventory_http_request_duration_seconds': {},
+            'inventory_request_db_seconds': {},
+            'inventory_request_render_seconds': {},
+            'inventory_request_queries': {},
+        }
+
+    def _observe(self, name, endpoint, value):
+        buckets = QUERY_COUNT_BUCKETS if name.endswith('_queries') else SECONDS_BUCKETS
+        self.histograms[name].setdefault(endpoint, Histogram(buckets)).observe(value)
+
+    def observe_request(self, endpoint, method, status, stats):
+        with self._lock:
+            self.requests[(endpoint, method, status)] += 1
+            self._observe('inventory_http_request_duration_seconds', endpoint, stats.elapsed())
+            self._observe('inventory_request_db_seconds', endpoint, stats.db_seconds)
+            self._observe('inventory_request_render_seconds', endpoint, stats.render_seconds)
+            self._observe('inventory_request_queries', endpoint, stats.queries)
+
+    def observe_slow_query(self):
+        with self._lock:
+            self.slow_queries += 1
+
+    def render(self, caches=None):
+        """Prometheus exposition text; `caches` maps cache name to its stats() dict."""
+        help_texts = {
+            'inventory_http_request_duration_seconds': 'Time spent handling the request (streamed bodies excluded)',
+            'inventory_request_db_seconds': 'Time spent in SQL statements per request',
+            'inventory_request_render_seconds': 'Time spent rendering templates per request',
+            'inventory_request_queries': 'SQL statements executed per request',
+        }
+        lines = [
+            '# HELP inventory_http_requests_total Requests handled, by endpoint, method and status',
+            '# TYPE inventory_http_requests_total counter',
+        ]
+        with self._lock:
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'inventory_http_requests_total{{{_labels(endpoint=endpoint, method=method, status=status)}}} {count}')
+
+            for metric, histograms in self.histograms.items():
+                lines.append(f'# HELP {metric} {help_texts[metric]}')
+                lines.append(f'# TYPE {metric} histogram')
+                for endpoint, histogram in sorted(histograms.items()):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{metric}_bucket{{{_labels(endpoint=endpoint, le=bound)}}} {count}')
+                    lines.append(f'{metric}_bucket{{{_labels(endpoint=endpoint, le="+Inf")}}} {histogram.count}')
+                    lines.append(f'{metric}_sum{{{_labels(endpoint=endpoint)}}} {histogram.sum:.6f}')
+                    lines.append(f'{metric}_count{{{_labels(endpoint=endpoint)}}} {histogram.count}')
+
+            lines.append('# HELP inventory_slow_queries_total SQL statements slower than SLOW_QUERY_MS')
+            lines.append('# TYPE inventory_slow_queries_total counter')
+            lines.append(f'inventory_slow_queries_total {self.slow_queries}')
+
+        for key, kind, help_text in (
+            ('hits', 'counter', 'Cache lookups answered from the cache'),
+            ('misses', 'counter', 'Cache lookups that missed'),
+            ('evictions', 'counter', 'Entries dropped to stay within the size limit'),
+            ('size', 'gauge', 'Entries currently cached'),
+        ):
+            metric = f'inventory_cache_{key}' + ('_total' if kind == 'counter' else '')
+            values = [(name, stats[key]) for name, stats in sorted((caches or {}).items()) if stats and key in stats]
+            if values:
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} {kind}')
+                lines.extend(f'{metric}{{{_labels(cache=name)}}} {value}' for name, value in values)
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_query_timer(exception_context):
+    # Failed statements never reach after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+
+    stats = g.get('request_stats') if has_request_context() else None
+    if stats is not None:
+        stats.record_query(statement, seconds)
+
+    threshold = current_app.config.get('SLOW_QUERY_MS', 0) if has_app_context() else 0
+    if threshold and seconds * 1000 >= threshold:
+        metrics.observe_slow_query()
+        logger.warning(
+            "Slow query (%.1f ms) in %s: %s",
+            seconds * 1000,
+            request.endpoint if has_request_context() else 'background',
+            ' '.join(statement.split()),
+        )
+
+
+def _start_render(sender, template, context, **extra):
+    stats = g.get('request_stats')
+    if stats is not None:
+        stats.render_started = time.perf_counter()
+
+
+def _stop_render(sender, template, context, **extra):
+    stats = g.get('request_stats')
+    if stats is not None and stats.render_started is not None:
+        stats.render_seconds += time.perf_counter() - stats.render_started
+        stats.render_started = None
+
+
+def server_timing(stats):
+    """Server-Timing header value: DB, template and total time in milliseconds."""
+    return ', '.join((
+        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"',
+        f'render;dur={stats.render_seconds * 1000:.1f}',
+        f'total;dur={stats.elapsed() * 1000:.1f}',
+    ))
+
+
+def _wants_panel(response):
+    return (
+        current_app.config.get('INSTRUMENTATION_PANEL')
+        and response.status_code == 200
+        and response.mimetype == 'text/html'
+        and not response.is_streamed
+        and current_user.is_authenticated
+        and current_user.is_admin()
+    )
+
+
+def init_instrumentation(app):
+    """Times every request's SQL and templates, and reports them per app.config.
+
+    Server-Timing goes on every response (SERVER_TIMING_ENABLED), admins get
+    an overlay panel on HTML pages (INSTRUMENTATION_PANEL) and every request
+    is added to the /metrics counters.
+    """
+    before_render_template.connect(_start_render, app)
+    template_rendered.connect(_stop_render, app)
+
+    @app.before_request
+    def start_request_stats():
+        g.request_stats = RequestStats()
+
+    @app.after_request
+    def finish_request_stats(response):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+
+        if _wants_panel(response):
+            panel = render_template(
+                'instrumentation_panel.html',
+                stats=stats,
+                total_ms=stats.elapsed() * 1000,
+                endpoint=request.endpoint,
+            )
+            body = response.get_data(as_text=True)
+            position = body.rfind('</body>')
+            if position != -1:
+                response.set_data(body[:position] + panel + body[position:])
+
+        if app.config.get('SERVER_TIMING_ENABLED', True):
+            response.headers['Server-Timing'] = server_timing(stats)
+        metrics.observe_request(request.endpoint or 'unmatched', request.method, response.status_code, stats)
+        return response
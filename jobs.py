@@ -0,0 +1,369 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import case, select, update
+from sqlalchemy.orm import joinedload
+from werkzeug.datastructures import MultiDict
+
+from dashboard import refresh_summary
+from exports import STREAM_BATCH_SIZE, encode_rows, stream_rows
+from import_parser import RejectsFile
+from models import db, Job
+from queries import INVENTORY_EXPORT_FIELDS, filtered_inventory_query, inventory_export_statement, inventory_filters
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled')
+
+
+class JobCancelled(Exception):
+    """Raised from JobContext.progress() once the job has been asked to stop."""
+
+
+class JobLeaseLost(Exception):
+    """Raised from JobContext.progress() when the job was requeued or finished by another runner."""
+
+
+def lease_conditions(job_id, attempt):
+    """WHERE conditions that hold while the runner that claimed `attempt` of the job still owns it."""
+    table = Job.__table__
+    return (table.c.id == job_id, table.c.status == 'running', table.c.attempts == attempt)
+
+
+class JobContext:
+    """What a job handler gets besides its Job: progress reporting and a place for files."""
+
+    def __init__(self, job_id, files_dir, attempt=None):
+        self.job_id = job_id
+        self.files_dir = files_dir
+        self.attempt = attempt
+
+    def progress(self, done, total=None):
+        """Records progress (and a heartbeat); raises JobCancelled if a cancel was requested.
+
+        Written on its own connection, so it neither commits nor disturbs the
+        handler's session (an export may be reading from a server-side cursor).
+        Raises JobLeaseLost if this run no longer owns the job.
+        """
+        table = Job.__table__
+        values = {'progress': done, 'heartbeat_at': datetime.utcnow()}
+        if total is not None:
+            values['total'] = total
+        with db.engine.begin() as connection:
+            row = connection.execute(
+                update(table).where(*lease_conditions(self.job_id, self.attempt)).values(**values)
+                .returning(table.c.cancel_requested)
+            ).first()
+        if row is None:
+            raise JobLeaseLost()
+        if row.cancel_requested:
+            raise JobCancelled()
+
+    def result_path(self, name):
+        return os.path.join(self.files_dir, f'job-{self.job_id}-{name}')
+
+
+def run_import(job, context):
+    """Imports an uploaded CSV with import_inventory.import_rows(), in committed batches.
+
+    Batches committed before a cancel or failure stay imported; a retry
+    upserts the whole file again (or, as a delta import, just what it had
+    not reached).
+    """
+    from import_inventory import import_rows  # It imports the app, so not at module load
+
+    # The rejects file, if any, is the job's download
+    rejects = RejectsFile(context.result_path('rejects.csv'))
+    with open(job.input_path, newline='', encoding='utf-8') as csvfile, rejects:
+        # Physical lines: a note spanning lines makes this an overestimate
+        context.progress(0, max(sum(1 for _ in csvfile) - 1, 0))
+        stats = import_rows(
+            csvfile, progress=lambda stats: context.progress(stats.rows),
+            delta=job.params.get('delta', False), decommission=job.params.get('decommission', False),
+            source=job.params.get('filename', ''), user=job.user, rejects=rejects,
+        )
+    context.progress(stats.rows)
+    if stats.rejected:
+        return rejects.path, f"Imported {stats}; download the rejected rows"
+    return None, f"Imported {stats}"
+
+
+def run_export(job, context):
+    """Writes the inventory list for the saved filters to a file, as the /inventory/export download would."""
+    export_format = job.params['format']
+    filters = inventory_filters(MultiDict(job.params.get('filters', {})))
+    total = filtered_inventory_query(filters)[0].order_by(None).count()
+    context.progress(0, total)
+
+    exported = 0
+
+    def counted(rows):
+        nonlocal exported
+        for row in rows:
+            yield row
+            exported += 1
+            if exported % STREAM_BATCH_SIZE == 0:
+                context.progress(exported)
+
+    path = context.result_path(f'inventory.{export_format}')
+    rows = counted(stream_rows(db.session, inventory_export_statement(filters)))
+    try:
+        with open(path, 'wb') as result_file:
+            for chunk in encode_rows(export_format, INVENTORY_EXPORT_FIELDS, rows):
+                result_file.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+    except BaseException:
+        os.remove(path)  # Cancelled or failed: no half-written download
+        raise
+    context.progress(exported)
+    return path, f"Exported {exported} items"
+
+
+def next_queued_job_id(connection):
+    """The oldest queued job's id, or None (an ix_job_status_id lookup, whatever the job history)."""
+    table = Job.__table__
+    return connection.execute(
+        select(table.c.id).where(table.c.status == 'queued').order_by(table.c.id).limit(1)
+    ).scalar()
+
+
+# Job.kind -> handler(job, context) returning (result file path or None, message)
+JOB_HANDLERS = {
+    'import': run_import,
+    'export': run_export,
+}
+
+
+class JobRunner:
+    """Runs queued jobs on `workers` background threads of this process.
+
+    Every process with a started runner (a dedicated `flask run-jobs`, or
+    each web worker with JOBS_IN_WEB) polls the job table; a job is claimed
+    with a conditional UPDATE, which makes the claiming attempt its lease
+    holder. A heartbeat thread renews the lease of every job this process
+    runs, however long the handler goes between progress reports. A job
+    whose heartbeat stops for `stale_after` seconds (its process died) is
+    put back in the queue, or failed after `max_attempts` claims; the
+    progress reports and the final status update of an attempt that lost
+    its lease change nothing, so a job is never finished twice.
+    """
+
+    def __init__(self, app, files_dir, workers=1, poll_interval=2.0, stale_after=120, max_attempts=3, periodic=()):
+        self.app = app
+        self.files_dir = files_dir
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        # (interval seconds, function) pairs run between jobs, e.g. the dashboard refresh
+        self.periodic = list(periodic)
+        os.makedirs(files_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._next_runs = [0.0] * len(self.periodic)
+        self._wake = threading.Event()
+        self._pid = None
+        self._running = {}  # job id -> the attempt this process claimed
+
+    def start(self):
+        """Starts the worker and heartbeat threads, once per process (they do not survive a fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._running = {}
+            for number in range(self.workers):
+                threading.Thread(target=self._work, name=f'job-worker-{number}', daemon=True).start()
+            threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True).start()
+
+    def wake(self):
+        """Makes idle worker threads poll now instead of at their next interval."""
+        self._wake.set()
+
+    def _work(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self._run_periodic()
+                    self._requeue_stale()
+                    claimed = self._claim()
+                    if claimed is not None:
+                        self._run(*claimed)
+                        continue
+            except Exception:
+                logger.exception("Job runner poll failed")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _run_periodic(self):
+        """Runs the periodic tasks that are due, on whichever worker thread polls first."""
+        now = time.monotonic()
+        with self._lock:
+            due = [number for number, run_at in enumerate(self._next_runs) if run_at <= now]
+            for number in due:
+                self._next_runs[number] = now + self.periodic[number][0]
+        for number in due:
+            try:
+                self.periodic[number][1]()
+            except Exception:
+                db.session.rollback()
+                logger.exception("Periodic task %s failed", self.periodic[number][1].__name__)
+
+    def _claim(self):
+        """Takes the oldest queued job; returns (its id, this attempt), or None when the queue is empty."""
+        table = Job.__table__
+        while True:
+            with db.engine.begin() as connection:
+                job_id = next_queued_job_id(connection)
+                if job_id is None:
+                    return None
+                now = datetime.utcnow()
+                attempt = connection.execute(
+                    update(table)
+                    .where(table.c.id == job_id, table.c.status == 'queued')
+                    .values(status='running', started_at=now, heartbeat_at=now, attempts=table.c.attempts + 1)
+                    .returning(table.c.attempts)
+                ).scalar()
+            if attempt is not None:
+                with self._lock:
+                    self._running[job_id] = attempt
+                return job_id, attempt
+            # Another runner took it between the SELECT and the UPDATE; try the next one
+
+    def _run(self, job_id, attempt):
+        job = db.session.get(Job, job_id)
+        context = JobContext(job_id, self.files_dir, attempt)
+        try:
+            result_path, message = JOB_HANDLERS[job.kind](job, context)
+            status = 'succeeded'
+        except JobCancelled:
+            db.session.rollback()
+            result_path, message, status = None, "Cancelled", 'cancelled'
+        except JobLeaseLost:
+            db.session.rollback()
+            result_path, message, status = None, None, None
+        except Exception as e:
+            db.session.rollback()
+            logger.exception("Job %s (%s) failed", job_id, job.kind)
+            result_path, message, status = None, f"Failed: {e}", 'failed'
+
+        with self._lock:
+            self._running.pop(job_id, None)
+        finished = 0
+        if status is not None:
+            with db.engine.begin() as connection:
+                finished = connection.execute(
+                    update(Job.__table__).where(*lease_conditions(job_id, attempt)).values(
+                        status=status, result_path=result_path, message=message[:255], finished_at=datetime.utcnow(),
+                    )
+                ).rowcount
+        if not finished:
+            logger.warning("Job %s lost its lease during attempt %s; its outcome was not recorded", job_id, attempt)
+
+    def _heartbeat(self):
+        """Renews the lease of the jobs this process runs, a few times per `stale_after`."""
+        while True:
+            time.sleep(max(self.stale_after / 4, 1))
+            with self._lock:
+                running = list(self._running.items())
+            if not running:
+                continue
+            try:
+                with self.app.app_context(), db.engine.begin() as connection:
+                    for job_id, attempt in running:
+                        connection.execute(
+                            update(Job.__table__).where(*lease_conditions(job_id, attempt))
+                            .values(heartbeat_at=datetime.utcnow())
+                        )
+            except Exception:
+                logger.exception("Could not renew the lease of jobs %s", [job_id for job_id, _ in running])
+
+    def _requeue_stale(self):
+        """Puts jobs whose runner stopped renewing their lease back in the queue (or fails or cancels them)."""
+        table = Job.__table__
+        now = datetime.utcnow()
+        given_up = table.c.attempts >= self.max_attempts
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(table)
+                .where(table.c.status == 'running', table.c.heartbeat_at < now - timedelta(seconds=self.stale_after))
+                .values(
+                    status=case((table.c.cancel_requested, 'cancelled'), (given_up, 'failed'), else_='queued'),
+                    message=case(
+                        (table.c.cancel_requested, "Cancelled"),
+                        (given_up, "Failed: the worker running it stopped on every attempt"),
+                        else_="Requeued: the worker running it stopped",
+                    ),
+                    finished_at=case((table.c.cancel_requested | given_up, now), else_=None),
+                )
+            )
+
+
+def enqueue_job(kind, user, params=None, input_path=None):
+    """Queues a job and nudges this process's runner; commits."""
+    job = Job(kind=kind, status='queued', params=params or {}, input_path=input_path, created_by=user.id)
+    db.session.add(job)
+    db.session.commit()
+    runner = _runner()
+    if runner is not None:
+        runner.wake()
+    return job
+
+
+def cancel_job(job):
+    """Cancels a queued job at once; a running one stops at its next progress report. Commits."""
+    if job.status == 'queued':
+        job.status = 'cancelled'
+        job.message = "Cancelled before it started"
+        job.finished_at = datetime.utcnow()
+    elif job.status == 'running':
+        job.cancel_requested = True
+    db.session.commit()
+
+
+def retry_job(job):
+    """Puts a failed or cancelled job back in the queue; commits."""
+    if job.status not in ('failed', 'cancelled'):
+        return
+    job.status = 'queued'
+    job.cancel_requested = False
+    job.progress = 0
+    job.total = None
+    job.message = None
+    job.result_path = None
+    job.started_at = job.heartbeat_at = job.finished_at = None
+    db.session.commit()
+    runner = _runner()
+    if runner is not None:
+        runner.wake()
+
+
+def recent_jobs(limit=50):
+    return Job.query.options(joinedload(Job.user)).order_by(Job.id.desc()).limit(limit).all()
+
+
+def _runner():
+    return current_app.extensions.get('job_runner')
+
+
+def init_jobs(app):
+    """Sets up the job runner; with JOBS_IN_WEB it starts in each web worker on its first request."""
+    refresh_interval = app.config.get('DASHBOARD_REFRESH_INTERVAL', 60)
+    runner = JobRunner(
+        app,
+        app.config.get('JOBS_DIR') or os.path.join(app.instance_path, 'jobs'),
+        workers=app.config.get('JOBS_WORKERS', 1),
+        poll_interval=app.config.get('JOBS_POLL_INTERVAL', 2.0),
+        stale_after=app.config.get('JOBS_STALE_AFTER', 120),
+        max_attempts=app.config.get('JOBS_MAX_ATTEMPTS', 3),
+        periodic=[(refresh_interval, refresh_summary)] if refresh_interval else [],
+    )
+    app.extensions['job_runner'] = runner
+    if app.config.get('JOBS_IN_WEB', False):
+        app.before_request(runner.start)
+    return runner
@@ -0,0 +1,68 @@
+"""Add inventory search index
+
+Revision ID: 3b9d2f6a1c47
+Revises: 65497c703b6c
+Create Date: 2026-10-18 09:12:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9d2f6a1c47'
+down_revision = '65497c703b6c'
+branch_labels = None
+depends_on = None
+
+SEARCH_COLUMNS = ('asset_tag', 'asset_type', 'site_name', 'assigned_to', 'model', 'serial_number', 'notes')
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        # Lower-cased search document kept current by Postgres itself, indexed for substring matches
+        document = " || ' ' || ".join(f"coalesce({column}, '')" for column in SEARCH_COLUMNS)
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute(f'ALTER TABLE inventory ADD COLUMN search_text text GENERATED ALWAYS AS (lower({document})) STORED')
+        op.execute('CREATE INDEX ix_inventory_search_trgm ON inventory USING gin (search_text gin_trgm_ops)')
+
+    elif bind.dialect.name == 'sqlite':
+        columns = ', '.join(SEARCH_COLUMNS)
+        new_values = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+        old_values = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS)
+
+        op.execute(
+            f"CREATE VIRTUAL TABLE inventory_fts USING fts5({columns}, "
+            f"content='inventory', content_rowid='id', tokenize='trigram')"
+        )
+        op.execute(
+            f"CREATE TRIGGER inventory_fts_ai AFTER INSERT ON inventory BEGIN "
+            f"INSERT INTO inventory_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER inventory_fts_ad AFTER DELETE ON inventory BEGIN "
+            f"INSERT INTO inventory_fts(inventory_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER inventory_fts_au AFTER UPDATE ON inventory BEGIN "
+            f"INSERT INTO inventory_fts(inventory_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO inventory_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        )
+        # Index the rows that already exist
+        op.execute("INSERT INTO inventory_fts(inventory_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_inventory_search_trgm')
+        op.execute('ALTER TABLE inventory DROP COLUMN IF EXISTS search_text')
+
+    elif bind.dialect.name == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS inventory_fts_au')
+        op.execute('DROP TRIGGER IF EXISTS inventory_fts_ad')
+        op.execute('DROP TRIGGER IF EXISTS inventory_fts_ai')
+        op.execute('DROP TABLE IF EXISTS inventory_fts')
@@ -0,0 +1,26 @@
+"""Add checkout item/return_date index
+
+Revision ID: 8c1e5a7d4f20
+Revises: 3b9d2f6a1c47
+Create Date: 2026-10-18 10:03:27.904551
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c1e5a7d4f20'
+down_revision = '3b9d2f6a1c47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('checkout', schema=None) as batch_op:
+        batch_op.create_index('ix_checkout_item_id_return_date', ['item_id', 'return_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('checkout', schema=None) as batch_op:
+        batch_op.drop_index('ix_checkout_item_id_return_date')
@@ -0,0 +1,28 @@
+"""Add api_token_hash to user for token authentication on the JSON API
+
+Revision ID: a7c1e5b9d382
+Revises: f3d94a2c6b71
+Create Date: 2026-10-19 14:26:51.338204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c1e5b9d382'
+down_revision = 'f3d94a2c6b71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('api_token_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_user_api_token_hash', ['api_token_hash'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_api_token_hash')
+        batch_op.drop_column('api_token_hash')
@@ -0,0 +1,54 @@
+"""Allow at most one open checkout per item
+
+Revision ID: a93e51c7d2b4
+Revises: f2b7d40c6e18
+Create Date: 2026-10-18 16:05:48.512930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a93e51c7d2b4'
+down_revision = 'f2b7d40c6e18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Racing checkouts may have left several open checkouts for one item. Keep the
+    # latest open; the older ones count as returned when the latest one began.
+    op.execute("""
+        UPDATE checkout
+        SET return_date = (
+            SELECT latest.checkout_date FROM checkout latest
+            WHERE latest.id = (
+                SELECT max(c.id) FROM checkout c
+                WHERE c.item_id = checkout.item_id AND c.return_date IS NULL
+            )
+        )
+        WHERE return_date IS NULL
+          AND id < (
+            SELECT max(c.id) FROM checkout c
+            WHERE c.item_id = checkout.item_id AND c.return_date IS NULL
+          )
+    """)
+
+    with op.batch_alter_table('checkout', schema=None) as batch_op:
+        batch_op.drop_index('ix_checkout_open_item_id')
+        batch_op.create_index(
+            'uq_checkout_open_item_id', ['item_id'], unique=True,
+            postgresql_where=sa.text('return_date IS NULL'),
+            sqlite_where=sa.text('return_date IS NULL'),
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('checkout', schema=None) as batch_op:
+        batch_op.drop_index('uq_checkout_open_item_id')
+        batch_op.create_index(
+            'ix_checkout_open_item_id', ['item_id'], unique=False,
+            postgresql_where=sa.text('return_date IS NULL'),
+            sqlite_where=sa.text('return_date IS NULL'),
+        )
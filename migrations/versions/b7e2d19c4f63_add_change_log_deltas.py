@@ -0,0 +1,27 @@
+"""Add field-level deltas to change_log
+
+Revision ID: b7e2d19c4f63
+Revises: a93e51c7d2b4
+Create Date: 2026-10-18 17:20:11.304518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d19c4f63'
+down_revision = 'a93e51c7d2b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows keep a NULL delta: what they changed was never recorded
+    with op.batch_alter_table('change_log', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('changes', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('change_log', schema=None) as batch_op:
+        batch_op.drop_column('changes')
@@ -0,0 +1,28 @@
+"""Add serial counter
+
+Revision ID: c47a09e3b2d5
+Revises: 8c1e5a7d4f20
+Create Date: 2026-10-18 10:41:09.116372
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47a09e3b2d5'
+down_revision = '8c1e5a7d4f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('serial_counter',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('next_value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('serial_counter')
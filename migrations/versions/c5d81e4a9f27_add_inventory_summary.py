@@ -0,0 +1,43 @@
+"""Add inventory summary tables for the dashboard
+
+Revision ID: c5d81e4a9f27
+Revises: b7e2d19c4f63
+Create Date: 2026-10-18 18:02:37.915204
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d81e4a9f27'
+down_revision = 'b7e2d19c4f63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('inventory_summary',
+    sa.Column('dimension', sa.String(length=30), nullable=False),
+    sa.Column('site_name', sa.String(length=100), nullable=False),
+    sa.Column('value', sa.String(length=100), nullable=False),
+    sa.Column('item_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('dimension', 'site_name', 'value')
+    )
+    summary_refresh = op.create_table('summary_refresh',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('source_versions', sa.JSON(), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    # Never built: the job runner's periodic refresh (or `flask refresh-dashboard`) fills it; page views only read it
+    op.bulk_insert(summary_refresh, [
+        {'name': 'inventory_summary', 'source_versions': {}, 'refreshed_at': datetime(1970, 1, 1)},
+    ])
+
+
+def downgrade():
+    op.drop_table('summary_refresh')
+    op.drop_table('inventory_summary')
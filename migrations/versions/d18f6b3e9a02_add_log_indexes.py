@@ -0,0 +1,30 @@
+"""Add log indexes
+
+Revision ID: d18f6b3e9a02
+Revises: c47a09e3b2d5
+Create Date: 2026-10-18 11:20:52.740119
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd18f6b3e9a02'
+down_revision = 'c47a09e3b2d5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('log', schema=None) as batch_op:
+        batch_op.create_index('ix_log_timestamp', ['timestamp'], unique=False)
+        batch_op.create_index('ix_log_action_timestamp', ['action', 'timestamp'], unique=False)
+        batch_op.create_index('ix_log_user_timestamp', ['user', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('log', schema=None) as batch_op:
+        batch_op.drop_index('ix_log_user_timestamp')
+        batch_op.drop_index('ix_log_action_timestamp')
+        batch_op.drop_index('ix_log_timestamp')
@@ -0,0 +1,31 @@
+"""Add table version counters
+
+Revision ID: e5a3c81f7b69
+Revises: d18f6b3e9a02
+Create Date: 2026-10-18 12:34:15.062847
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a3c81f7b69'
+down_revision = 'd18f6b3e9a02'
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = ('inventory', 'checkout', 'loan', 'user', 'change_log')
+
+
+def upgrade():
+    table_version = op.create_table('table_version',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(table_version, [{'name': name, 'version': 0} for name in VERSIONED_TABLES])
+
+
+def downgrade():
+    op.drop_table('table_version')
@@ -0,0 +1,27 @@
+"""Add import_hash to inventory for delta imports
+
+Revision ID: e9c27b4d1a85
+Revises: d6a3f08b5e12
+Create Date: 2026-10-18 20:02:37.518206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9c27b4d1a85'
+down_revision = 'd6a3f08b5e12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows start without a hash, so the first delta import rewrites them once
+    with op.batch_alter_table('inventory', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('import_hash', sa.String(length=32), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('inventory', schema=None) as batch_op:
+        batch_op.drop_column('import_hash')
@@ -0,0 +1,60 @@
+"""Add indexes for inventory filters/sorts, loaners and item history
+
+Revision ID: f2b7d40c6e18
+Revises: e5a3c81f7b69
+Create Date: 2026-10-18 14:41:09.318264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b7d40c6e18'
+down_revision = 'e5a3c81f7b69'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('inventory', schema=None) as batch_op:
+        batch_op.create_index('ix_inventory_site_name_id', ['site_name', 'id'], unique=False)
+        batch_op.create_index('ix_inventory_asset_type_id', ['asset_type', 'id'], unique=False)
+        batch_op.create_index('ix_inventory_assigned_to_id', [sa.text("coalesce(assigned_to, '')"), 'id'], unique=False)
+        batch_op.create_index(
+            'ix_inventory_loaner_asset_tag', ['asset_tag'], unique=False,
+            postgresql_where=sa.text('is_loaner = true'),
+            sqlite_where=sa.text('is_loaner = 1'),
+        )
+
+    with op.batch_alter_table('checkout', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_checkout_open_item_id', ['item_id'], unique=False,
+            postgresql_where=sa.text('return_date IS NULL'),
+            sqlite_where=sa.text('return_date IS NULL'),
+        )
+        batch_op.create_index('ix_checkout_checkout_date_id', ['checkout_date', 'id'], unique=False)
+
+    with op.batch_alter_table('loan', schema=None) as batch_op:
+        batch_op.create_index('ix_loan_item_id_checkout_date', ['item_id', 'checkout_date'], unique=False)
+
+    with op.batch_alter_table('change_log', schema=None) as batch_op:
+        batch_op.create_index('ix_change_log_item_id_timestamp', ['item_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('change_log', schema=None) as batch_op:
+        batch_op.drop_index('ix_change_log_item_id_timestamp')
+
+    with op.batch_alter_table('loan', schema=None) as batch_op:
+        batch_op.drop_index('ix_loan_item_id_checkout_date')
+
+    with op.batch_alter_table('checkout', schema=None) as batch_op:
+        batch_op.drop_index('ix_checkout_checkout_date_id')
+        batch_op.drop_index('ix_checkout_open_item_id')
+
+    with op.batch_alter_table('inventory', schema=None) as batch_op:
+        batch_op.drop_index('ix_inventory_loaner_asset_tag')
+        batch_op.drop_index('ix_inventory_assigned_to_id')
+        batch_op.drop_index('ix_inventory_asset_type_id')
+        batch_op.drop_index('ix_inventory_site_name_id')
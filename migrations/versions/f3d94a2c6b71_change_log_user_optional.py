@@ -0,0 +1,28 @@
+"""Allow change_log rows without a user, for command-line imports
+
+Revision ID: f3d94a2c6b71
+Revises: e9c27b4d1a85
+Create Date: 2026-10-19 09:12:44.903152
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3d94a2c6b71'
+down_revision = 'e9c27b4d1a85'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('change_log', schema=None) as batch_op:
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade():
+    # Rows written by command-line imports have no user to restore
+    op.execute("DELETE FROM change_log WHERE user_id IS NULL")
+    with op.batch_alter_table('change_log', schema=None) as batch_op:
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=False)
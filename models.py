@@ -2,6 +2,8 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import hashlib
+import secrets
 
 
 db = SQLAlchemy()
@@ -11,6 +13,8 @@ class User(db.Model, UserMixin):
     username = db.Column(db.String(100), unique=True, nullable=False)
     password_hash = db.Column(db.String(200), nullable=False)
     role = db.Column(db.String(20), nullable=False)  # Admin, Editor, Reader
+    # SHA-256 of the user's API token (see `flask api-token`); NULL: browser login only
+    api_token_hash = db.Column(db.String(64), nullable=True, unique=True, index=True)
 
     # Define relationships correctly with explicit foreign keys
     checkouts = db.relationship("Checkout", foreign_keys="Checkout.user_id", back_populates="user")
@@ -21,6 +25,17 @@ class User(db.Model, UserMixin):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    def set_api_token(self):
+        """Replaces the user's API token; returns the new one, which is only stored hashed."""
+        token = secrets.token_urlsafe(32)
+        self.api_token_hash = self.hash_api_token(token)
+        return token
+
+    @staticmethod
+    def hash_api_token(token):
+        # Tokens are long and random, so a fast unsalted hash is enough and can be looked up
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
     def is_admin(self):
         return self.role == "Admin"
 
@@ -31,6 +46,19 @@ class User(db.Model, UserMixin):
         return self.role == "Reader"
 
 class Inventory(db.Model):
+    __table_args__ = (
+        # List filters and sorts; every sort ends on id, so id rides along in the index
+        db.Index('ix_inventory_site_name_id', 'site_name', 'id'),
+        db.Index('ix_inventory_asset_type_id', 'asset_type', 'id'),
+        db.Index('ix_inventory_assigned_to_id', db.text("coalesce(assigned_to, '')"), 'id'),
+        # Only a handful of items are loaners; the loaner pages read just those
+        db.Index(
+            'ix_inventory_loaner_asset_tag', 'asset_tag',
+            postgresql_where=db.text('is_loaner = true'),
+            sqlite_where=db.text('is_loaner = 1'),
+        ),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     site_name = db.Column(db.String(100), nullable=False)
     room_number = db.Column(db.String(20), nullable=True)
@@ -45,6 +73,8 @@ class Inventory(db.Model):
     date_assigned = db.Column(db.Date, nullable=True)
     date_decommissioned = db.Column(db.Date, nullable=True)
     is_loaner = db.Column(db.Boolean, default=False)
+    # Digest of the source row this item was last imported from; NULL for items added in the app
+    import_hash = db.Column(db.String(32), nullable=True)
     
     # Updated relationships with explicit foreign keys to avoid ambiguity
     loans = db.relationship('Loan', foreign_keys="Loan.item_id", backref='inventory_item', lazy=True)
@@ -56,6 +86,10 @@ class Inventory(db.Model):
 
 class Loan(db.Model):
     __tablename__ = 'loan'
+    __table_args__ = (
+        # Item details lists an item's loans newest first
+        db.Index('ix_loan_item_id_checkout_date', 'item_id', 'checkout_date'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     item_id = db.Column(db.Integer, db.ForeignKey('inventory.id'), nullable=False)
@@ -64,6 +98,13 @@ class Loan(db.Model):
     return_date = db.Column(db.DateTime, nullable=True)
 
 class Log(db.Model):
+    __table_args__ = (
+        # /logs pages newest-first and filters by date range, action and user
+        db.Index('ix_log_timestamp', 'timestamp'),
+        db.Index('ix_log_action_timestamp', 'action', 'timestamp'),
+        db.Index('ix_log_user_timestamp', 'user', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     action = db.Column(db.String(100), nullable=False)
     user = db.Column(db.String(100), nullable=False)
@@ -71,15 +112,36 @@ class Log(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
 class ChangeLog(db.Model):
+    __table_args__ = (
+        # An item's change history, in order
+        db.Index('ix_change_log_item_id_timestamp', 'item_id', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     item_id = db.Column(db.Integer, db.ForeignKey('inventory.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # NULL for changes written by an import run from the command line
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     change_description = db.Column(db.String(255), nullable=False)
+    # Changed fields only, as {field: [old, new]}; NULL on rows logged before deltas were kept
+    changes = db.Column(db.JSON, nullable=True)
 
     user = db.relationship('User', backref='changes')
 
 class Checkout(db.Model):
+    __table_args__ = (
+        # Serves the "open checkouts for this item" lookups
+        db.Index('ix_checkout_item_id_return_date', 'item_id', 'return_date'),
+        # At most one open checkout per item, enforced by the database (see checkouts.check_out)
+        db.Index(
+            'uq_checkout_open_item_id', 'item_id', unique=True,
+            postgresql_where=db.text('return_date IS NULL'),
+            sqlite_where=db.text('return_date IS NULL'),
+        ),
+        # Loaner history pages newest first
+        db.Index('ix_checkout_checkout_date_id', 'checkout_date', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     
     # Match the existing database columns
@@ -94,3 +156,64 @@ class Checkout(db.Model):
 
     # Define relationship with explicit foreign key to avoid ambiguity
     user = db.relationship("User", foreign_keys=[user_id], back_populates="checkouts")
+
+class SerialCounter(db.Model):
+    """Named counters handed out in blocks, e.g. for placeholder serial numbers."""
+    __tablename__ = 'serial_counter'
+
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False)
+
+class TableVersion(db.Model):
+    """Per-table change counter, bumped in the same transaction as every write to that table."""
+    __tablename__ = 'table_version'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+class InventorySummary(db.Model):
+    """Item counts per site for each dashboard dimension, rebuilt from inventory and checkout."""
+    __tablename__ = 'inventory_summary'
+
+    dimension = db.Column(db.String(30), primary_key=True)
+    site_name = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.String(100), primary_key=True)  # '' for a NULL value
+    item_count = db.Column(db.Integer, nullable=False)
+
+class SummaryRefresh(db.Model):
+    """When a summary was last rebuilt, and from which table versions."""
+    __tablename__ = 'summary_refresh'
+
+    name = db.Column(db.String(50), primary_key=True)
+    source_versions = db.Column(db.JSON, nullable=False)
+    refreshed_at = db.Column(db.DateTime, nullable=False)
+
+class Job(db.Model):
+    """A background import or export, claimed and run by a jobs.JobRunner."""
+    __table_args__ = (
+        # Runners poll for the oldest queued job
+        db.Index('ix_job_status_id', 'status', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # import, export
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed, cancelled
+    params = db.Column(db.JSON, nullable=False, default=dict)
+    input_path = db.Column(db.String(255), nullable=True)
+    result_path = db.Column(db.String(255), nullable=True)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=True)
+    message = db.Column(db.String(255), nullable=True)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    user = db.relationship('User')
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
@@ -0,0 +1,146 @@
+import glob
+import multiprocessing
+import os
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import count, islice
+
+from facets import invalidate_facets
+from import_inventory import DEFAULT_BATCH_SIZE, ImportStats, resolve_batch, upsert_statement
+from import_parser import parse_file
+from models import db, ChangeLog
+from response_cache import bump_table_versions
+from serials import placeholder_serials
+
+# An asset tag or serial more than one file claims: `sources` are (file name, row number), `kept` the one that wins
+# (for a serial, unless the database already gives it to another asset)
+Conflict = namedtuple('Conflict', 'kind value sources kept')
+
+
+def csv_paths(sources):
+    """The CSV files named by `sources` (directories, globs or plain paths), sorted and deduplicated."""
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths.extend(glob.glob(os.path.join(source, '*.csv')))
+        else:
+            paths.extend(glob.glob(source))
+    return sorted(set(paths))
+
+
+def resolve_conflicts(parsed_files):
+    """Picks one record per asset tag across all files; returns (records, conflicts).
+
+    As within a file, the last occurrence of a tag wins (files are taken in
+    path order). Serials two winning records share are reported here and
+    settled by resolve_batch(): the first asset to claim one keeps it.
+    """
+    winners = {}
+    sources = defaultdict(list)
+    for parsed in parsed_files:
+        file_name = os.path.basename(parsed.path)
+        for number, record in parsed.records:
+            winners[record['asset_tag']] = (number, record)
+            sources[record['asset_tag']].append((file_name, number))
+
+    conflicts = []
+    for tag, found in sources.items():
+        if len({file_name for file_name, _ in found}) > 1:
+            conflicts.append(Conflict('asset_tag', tag, found, found[-1]))
+
+    serial_claims = defaultdict(list)
+    for tag, (_, record) in winners.items():
+        if record['serial_number']:
+            serial_claims[record['serial_number']].append(tag)
+    for serial, tags in serial_claims.items():
+        claimed_by = [sources[tag][-1] for tag in tags]
+        if len({file_name for file_name, _ in claimed_by}) > 1:
+            conflicts.append(Conflict('serial_number', serial, claimed_by, claimed_by[0]))
+
+    return list(winners.values()), conflicts
+
+
+def write_shard(engine, statement, records, changes, batch_size):
+    """Upserts one site's records in committed batches on a connection of its own.
+
+    Each batch's ChangeLog rows (`changes` maps asset tag to them) commit with it.
+    """
+    rows = iter(records)
+    while batch := list(islice(rows, batch_size)):
+        with engine.begin() as connection:
+            connection.execute(statement, batch)
+            batch_changes = [changes[record['asset_tag']] for record in batch if record['asset_tag'] in changes]
+            if batch_changes:
+                connection.execute(ChangeLog.__table__.insert(), batch_changes)
+    return len(records)
+
+
+def import_files(paths, workers=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, delta=False, progress=None,
+                 rejects=None):
+    """Imports several CSVs: parsed in a process pool, checked together, written in per-site shards.
+
+    Must run inside an app context. Nothing is written unless every file
+    parses. Each record's tag and serial are settled against the database
+    and the other files before any write, so shards hold disjoint assets
+    and serials and can upsert side by side without blocking each other.
+    Changes to existing assets are logged in ChangeLog with no user, in
+    the transaction of the batch that makes them. Shards write on their
+    own connections, outside the session, so the cache version counters
+    are bumped once at the end rather than by every batch of every shard.
+    SQLite allows one writer, so there the shards go one after another.
+    Returns (ImportStats, conflicts, failed files as
+    import_parser.ParsedFile), and `progress` is called with each one.
+    stats.rows counts assets once however many files carry them. Rows the
+    parser rejected are written to `rejects` (an import_parser.RejectsFile)
+    if given, tagged with their file.
+    """
+    stats = ImportStats()
+    parsed_files = []
+    # Spawned, not forked: the app has started threads (the audit writer) that a fork would copy mid-flight
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        for parsed in executor.map(parse_file, paths):
+            parsed_files.append(parsed)
+            if progress:
+                progress(parsed)
+    failed = [parsed for parsed in parsed_files if parsed.error]
+    if failed:
+        return stats, [], failed
+
+    records, conflicts = resolve_conflicts(parsed_files)
+    # Each asset once: a tag several files carry is one row, the one resolve_conflicts() kept
+    stats.rows = len(records)
+    for parsed in parsed_files:
+        stats.rejected += len({reject.row for reject in parsed.rejects})
+        if rejects is not None:
+            rejects.write(parsed.rejects)
+
+    seen_tags = set()
+    claimed_serials = {}
+    dry_run_serials = count(1)
+    allocate_serial = (lambda: f"SN-DRY-RUN-{next(dry_run_serials)}") if dry_run else placeholder_serials.allocate
+    shards = defaultdict(list)
+    changes = {}
+    pending = iter(records)
+    while batch := list(islice(pending, batch_size)):
+        resolved = resolve_batch(batch, seen_tags, claimed_serials, stats, allocate_serial, delta=delta,
+                                 changes=None if dry_run else changes)
+        for record in resolved:
+            shards[record['site_name']].append(record)
+        stats.batches += 1
+    db.session.commit()  # End the read transaction before the shards write
+
+    if dry_run or not shards:
+        return stats, conflicts, []
+
+    engine = db.engine
+    statement = upsert_statement()
+    writers = 1 if engine.dialect.name == 'sqlite' else min(workers or os.cpu_count() or 1, len(shards))
+    with ThreadPoolExecutor(max_workers=writers) as executor:
+        # Largest sites first, so one big shard does not start last
+        ordered = sorted(shards.values(), key=len, reverse=True)
+        list(executor.map(lambda shard: write_shard(engine, statement, shard, changes, batch_size), ordered))
+
+    with engine.begin() as connection:
+        bump_table_versions(connection, {'inventory', 'change_log'})
+    invalidate_facets()
+    return stats, conflicts, []
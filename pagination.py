@@ -0,0 +1,147 @@
+import base64
+import json
+from datetime import date, datetime
+
+from sqlalchemy import and_, or_, tuple_
+
+
+class KeysetPage:
+    """One page of keyset-paginated results plus opaque cursors to its neighbours."""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None, offset=0):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.offset = offset
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    @property
+    def first(self):
+        """1-based position of the first item on this page (0 when empty)."""
+        return self.offset + 1 if self.items else 0
+
+    @property
+    def last(self):
+        return self.offset + len(self.items)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+    return value
+
+
+def encode_cursor(payload):
+    """Serializes a cursor payload into an opaque, URL-safe token."""
+    payload = dict(payload, k=[_encode_value(v) for v in payload["k"]])
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    """Decodes a cursor token, returns None if it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        payload["k"] = [_decode_value(v) for v in payload["k"]]
+        if payload.get("d") not in ("n", "p"):
+            return None
+        return payload
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+def _seek_predicate(keys, values, forward):
+    """Builds the WHERE clause selecting rows strictly after (or before) `values`."""
+    directions = {desc for _, desc in keys}
+    if len(directions) == 1:
+        # Uniform direction: a row-value comparison lets the database seek the index directly
+        descending = directions.pop() != (not forward)
+        left = tuple_(*[expr for expr, _ in keys])
+        right = tuple_(*values)
+        return left < right if descending else left > right
+
+    clauses = []
+    for i, (expr, desc) in enumerate(keys):
+        descending = desc != (not forward)
+        step = expr < values[i] if descending else expr > values[i]
+        equal = [keys[j][0] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+
+def keyset_paginate(query, keys, cursor=None, per_page=25, count=True):
+    """Paginates `query` by seeking on `keys` instead of using OFFSET.
+
+    `keys` is a list of (expression, descending) pairs; the last one must be
+    unique (normally the primary key) so every row has a distinct position.
+    Key expressions must never be NULL, wrap nullable columns in coalesce().
+
+    The total row count is computed once, on the first page, and carried in
+    the cursors afterwards, so later pages never run COUNT(*). Pass
+    count=False to skip it entirely.
+    """
+    state = decode_cursor(cursor) if isinstance(cursor, str) else cursor
+    total = state.get("t") if state else None
+    offset = state.get("o", 0) if state else 0
+    forward = not state or state["d"] == "n"
+
+    if count and total is None:
+        total = query.order_by(None).count()
+
+    seek = query
+    if state:
+        seek = seek.filter(_seek_predicate(keys, state["k"], forward))
+
+    ordering = []
+    for expr, desc in keys:
+        descending = desc != (not forward)
+        ordering.append(expr.desc() if descending else expr.asc())
+
+    rows = seek.add_columns(*[expr for expr, _ in keys]) \
+        .order_by(None).order_by(*ordering) \
+        .limit(per_page + 1).all()
+
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+        if not more:
+            # Ran into the start of the result set; rows before `offset` may have been deleted
+            offset = 0
+
+    items = [row[0] for row in rows]
+    next_cursor = prev_cursor = None
+    if rows:
+        first_key = list(rows[0][1:])
+        last_key = list(rows[-1][1:])
+        # Moving forward, a next page exists only if we over-fetched; moving
+        # backward we came from it. The reverse holds for the previous page.
+        if more or not forward:
+            next_cursor = encode_cursor({"d": "n", "k": last_key, "o": offset + len(rows), "t": total})
+        if (more and not forward) or (forward and state):
+            prev_cursor = encode_cursor({"d": "p", "k": first_key, "o": max(offset - per_page, 0), "t": total})
+
+    return KeysetPage(items, per_page, next_cursor, prev_cursor, total, offset)
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+from sqlalchemy.orm import contains_eager, joinedload
+from models import db, Inventory, Checkout, Log
+from search import apply_search
+
+# Keyset sort keys; every sort ends on Inventory.id so positions are unique.
+# assigned_to is nullable, so it is coalesced to keep the seek comparison valid;
+# the '' is a literal so the expression matches ix_inventory_assigned_to_id.
+SORT_KEYS = {
+    'asset_tag': Inventory.asset_tag,
+    'site_name': Inventory.site_name,
+    'assigned_to': db.func.coalesce(Inventory.assigned_to, db.literal_column("''")),
+}
+
+def inventory_filters(args):
+    """Reads the inventory list filter/sort arguments from a request's query args."""
+    query = args.get('query', '', type=str).strip()
+    # Searches are ordered by relevance unless a column sort was picked explicitly
+    sort_by = args.get('sort_by', '', type=str) or ('relevance' if query else 'asset_tag')
+    if sort_by not in SORT_KEYS and not (sort_by == 'relevance' and query):
+        sort_by = 'asset_tag'
+    return {
+        'query': query,
+        'asset_type': args.get('asset_type', '', type=str),
+        'site_name': args.get('site_name', '', type=str),
+        'assigned_to': args.get('assigned_to', '', type=str),
+        'sort_by': sort_by,
+    }
+
+def filtered_inventory_query(filters):
+    """Builds the (unordered) inventory query for the given filters.
+
+    Returns the query and the search rank sort key (None when there is no
+    free-text query or it cannot be ranked).
+    """
+    inventory_query, rank_key = apply_search(Inventory.query, filters['query'])
+
+    # Type and site come from the facet dropdowns, so they match exactly (and use their indexes)
+    if filters['asset_type']:
+        inventory_query = inventory_query.filter(Inventory.asset_type == filters['asset_type'])
+
+    if filters['site_name']:
+        inventory_query = inventory_query.filter(Inventory.site_name == filters['site_name'])
+
+    if filters['assigned_to']:
+        inventory_query = inventory_query.filter(Inventory.assigned_to.ilike(f"%{filters['assigned_to']}%"))
+
+    return inventory_query, rank_key
+
+def inventory_sort_keys(filters, rank_key):
+    """Keyset sort keys for the list; relevance falls back to asset tag when unranked."""
+    if filters['sort_by'] == 'relevance':
+        primary = rank_key or (SORT_KEYS['asset_tag'], False)
+    else:
+        primary = (SORT_KEYS[filters['sort_by']], False)
+    return [primary, (Inventory.id, False)]
+
+# import_inventory.py's columns first, so an export can be fed back to it
+INVENTORY_EXPORT_FIELDS = (
+    'site_name', 'room_number', 'room_name', 'asset_tag', 'asset_type', 'model',
+    'serial_number', 'notes', 'assigned_to', 'date_assigned', 'date_decommissioned',
+    'category', 'is_loaner',
+)
+
+def inventory_export_statement(filters):
+    """SELECT of INVENTORY_EXPORT_FIELDS for every item the list shows, in the list's order."""
+    inventory_query, rank_key = filtered_inventory_query(filters)
+    order_by = [key.desc() if descending else key.asc() for key, descending in inventory_sort_keys(filters, rank_key)]
+    return inventory_query\
+        .with_entities(*(getattr(Inventory, field) for field in INVENTORY_EXPORT_FIELDS))\
+        .order_by(*order_by)\
+        .statement
+
+def loaner_status_query():
+    """Every loaner with its open checkout (or None) and that checkout's user, as one query."""
+    # An item has at most one open checkout (uq_checkout_open_item_id), so a plain join finds it
+    return db.session.query(Inventory, Checkout)\
+        .outerjoin(Checkout, db.and_(Checkout.item_id == Inventory.id, Checkout.return_date.is_(None)))\
+        .options(joinedload(Checkout.user))\
+        .filter(Inventory.is_loaner == True)\
+        .order_by(Inventory.asset_tag)
+
+# Loaner history and /logs page newest first
+LOANER_HISTORY_KEYS = [(Checkout.checkout_date, True), (Checkout.id, True)]
+LOG_KEYS = [(Log.timestamp, True), (Log.id, True)]
+
+def date_range_conditions(column, start, end):
+    """Conditions restricting a datetime column to the days start..end (both inclusive)."""
+    conditions = []
+    if start:
+        conditions.append(column >= datetime.combine(start, datetime.min.time()))
+    if end:
+        conditions.append(column < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    return conditions
+
+def log_conditions(filters):
+    """WHERE conditions for the /logs filters; each one is backed by a log index."""
+    conditions = date_range_conditions(Log.timestamp, filters['start'], filters['end'])
+    if filters['action']:
+        conditions.append(Log.action == filters['action'])
+    if filters['user']:
+        conditions.append(Log.user == filters['user'])
+    return conditions
+
+def loaner_history_query(filters):
+    """Checkouts of loaner items, with their item and user loaded by the same query."""
+    checkouts_query = Checkout.query\
+        .join(Checkout.inventory_item)\
+        .options(contains_eager(Checkout.inventory_item), joinedload(Checkout.user))\
+        .filter(Inventory.is_loaner == True)\
+        .filter(*date_range_conditions(Checkout.checkout_date, filters['start'], filters['end']))
+
+    if filters['item']:
+        checkouts_query = checkouts_query.filter(Inventory.asset_tag.ilike(f"{filters['item']}%"))
+
+    if filters['borrower']:
+        checkouts_query = checkouts_query.filter(Checkout.borrower_name.ilike(f"%{filters['borrower']}%"))
+
+    return checkouts_query
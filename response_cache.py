@@ -0,0 +1,126 @@
+import hashlib
+import time
+from functools import wraps
+from itertools import chain
+
+from flask import current_app, make_response, request
+from flask_login import current_user
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from caching import backend_from_url
+from models import db, TableVersion
+
+# Tables whose writes invalidate cached pages
+VERSIONED_TABLES = frozenset(('inventory', 'checkout', 'loan', 'user', 'change_log'))
+
+
+def bump_table_versions(connection, tables):
+    """Increments the version counters of `tables` inside the caller's transaction.
+
+    ORM flushes and session.execute() DML are tracked automatically; only
+    raw SQL writes need to call this themselves.
+    """
+    tables = set(tables) & VERSIONED_TABLES
+    if tables:
+        table = TableVersion.__table__
+        connection.execute(
+            update(table).where(table.c.name.in_(sorted(tables))).values(version=table.c.version + 1)
+        )
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_after_flush(session, flush_context):
+    tables = {
+        obj.__table__.name
+        for obj in chain(session.new, session.dirty, session.deleted)
+        if hasattr(obj, '__table__')
+    }
+    bump_table_versions(session.connection(), tables)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bump_before_bulk_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        name = getattr(table, 'name', None)
+        if name:
+            bump_table_versions(orm_execute_state.session.connection(), {name})
+
+
+def table_versions(tables):
+    """Current version of each table, creating counters that do not exist yet."""
+    table = TableVersion.__table__
+    versions = dict(db.session.execute(
+        select(table.c.name, table.c.version).where(table.c.name.in_(sorted(tables)))
+    ).all())
+    missing = set(tables) - versions.keys()
+    if missing:
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(insert(table), [{'name': name, 'version': 0} for name in sorted(missing)])
+        except IntegrityError:
+            pass  # Another worker created them first
+        versions.update(dict.fromkeys(missing, 0))
+    return versions
+
+
+def init_response_cache(app):
+    if app.config.get('RESPONSE_CACHE_ENABLED', True):
+        app.extensions['response_cache'] = backend_from_url(
+            app.config.get('RESPONSE_CACHE_URL'),
+            maxsize=app.config.get('RESPONSE_CACHE_SIZE', 512),
+            ttl=app.config.get('RESPONSE_CACHE_TTL', 300),
+        )
+
+
+def cached_page(*tables):
+    """Caches a GET view's rendered response until one of `tables` is written.
+
+    The key covers the path, query args, the user's role (pages differ by
+    role only) and the current versions of `tables`, and doubles as the
+    ETag, so unchanged pages answer If-None-Match with 304 before anything
+    is rendered or even looked up.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            backend = current_app.extensions.get('response_cache')
+            if backend is None or request.method != 'GET':
+                return view(*args, **kwargs)
+
+            # Read versions before rendering: a write racing the render then only misses, never serves stale
+            versions = table_versions(tables)
+            role = current_user.role if current_user.is_authenticated else None
+            key = hashlib.sha1(repr((
+                request.path,
+                sorted(request.args.items(multi=True)),
+                role,
+                sorted(versions.items()),
+            )).encode('utf-8')).hexdigest()
+
+            if request.if_none_match.contains(key):
+                response = current_app.response_class(status=304)
+            else:
+                entry = backend.get(key)
+                if entry is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    entry = {
+                        'body': response.get_data(),
+                        'content_type': response.content_type,
+                        'last_modified': time.time(),
+                    }
+                    backend.set(key, entry)
+                else:
+                    response = current_app.response_class(entry['body'], content_type=entry['content_type'])
+                response.last_modified = entry['last_modified']
+
+            response.set_etag(key)
+            # Browsers may keep the page but must revalidate it every time
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response.make_conditional(request)
+        return wrapped
+    return decorator
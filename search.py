@@ -0,0 +1,97 @@
+import re
+import weakref
+
+from sqlalchemy import Double, Float, Integer, and_, cast, func, inspect, literal_column, or_, text
+
+from models import db, Inventory
+
+# Columns covered by the free-text search box
+SEARCH_COLUMNS = ('asset_tag', 'asset_type', 'site_name', 'assigned_to', 'model', 'serial_number', 'notes')
+
+# SQLite FTS5 table (trigram tokenizer) kept in sync with inventory by triggers
+FTS_TABLE = 'inventory_fts'
+
+# Postgres generated column holding the lower-cased search document, GIN trigram indexed
+SEARCH_TEXT_COLUMN = 'search_text'
+
+# Trigram indexes cannot serve terms shorter than one trigram
+MIN_TERM_LENGTH = 3
+
+_backends = weakref.WeakKeyDictionary()
+
+
+def search_backend(engine=None):
+    """Returns 'postgres', 'fts5' or 'like' depending on which search index the database has."""
+    engine = engine or db.engine
+    backend = _backends.get(engine)
+    if backend is None:
+        inspector = inspect(engine)
+        backend = 'like'
+        if engine.dialect.name == 'postgresql':
+            columns = {column['name'] for column in inspector.get_columns('inventory')}
+            if SEARCH_TEXT_COLUMN in columns:
+                backend = 'postgres'
+        elif engine.dialect.name == 'sqlite' and inspector.has_table(FTS_TABLE):
+            backend = 'fts5'
+        _backends[engine] = backend
+    return backend
+
+
+def search_terms(text_query):
+    """Splits a search box string into distinct, non-empty terms."""
+    terms = []
+    for term in text_query.split():
+        if term.lower() not in (t.lower() for t in terms):
+            terms.append(term)
+    return terms
+
+
+def _like_pattern(term):
+    return '%' + re.sub(r'([\\%_])', r'\\\1', term.lower()) + '%'
+
+
+def _like_any_column(term):
+    """Unindexed fallback: case-insensitive substring match against any search column."""
+    pattern = _like_pattern(term)
+    return or_(*[getattr(Inventory, name).ilike(pattern, escape='\\') for name in SEARCH_COLUMNS])
+
+
+def _fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def apply_search(query, text_query):
+    """Restricts an Inventory query to rows matching every term of `text_query`.
+
+    Returns the filtered query and a (rank expression, descending) sort key,
+    or None for the rank when no search index is available to score matches.
+    """
+    terms = search_terms(text_query)
+    if not terms:
+        return query, None
+
+    backend = search_backend()
+    indexed = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+    short = [term for term in terms if len(term) < MIN_TERM_LENGTH]
+
+    if backend == 'like' or not indexed:
+        return query.filter(and_(*[_like_any_column(term) for term in terms])), None
+
+    if backend == 'postgres':
+        search_text = literal_column(f'inventory.{SEARCH_TEXT_COLUMN}')
+        query = query.filter(and_(*[search_text.like(_like_pattern(term), escape='\\') for term in terms]))
+        # word_similarity() is a float4; as a float8 the rank sorts, round-trips through the
+        # cursor and compares against it exactly, so tied ranks never repeat or skip rows
+        rank = cast(func.word_similarity(text_query.lower(), search_text), Double)
+        return query, (rank, True)
+
+    # SQLite FTS5: match the indexed terms, then narrow the (small) result by any short ones
+    matches = text(
+        f"SELECT rowid AS id, bm25({FTS_TABLE}) AS rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+    ).bindparams(match=' AND '.join(_fts_phrase(term) for term in indexed)) \
+        .columns(id=Integer, rank=Float).subquery('fts_matches')
+    query = query.join(matches, matches.c.id == Inventory.id)
+    if short:
+        query = query.filter(and_(*[_like_any_column(term) for term in short]))
+    # bm25() scores better matches lower
+    return query, (matches.c.rank, False)
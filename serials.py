@@ -0,0 +1,57 @@
+import threading
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, SerialCounter
+
+
+class SerialAllocator:
+    """Hands out placeholder serial numbers that can never collide.
+
+    Numbers come from a named row in serial_counter. Each process reserves
+    a block of `block_size` values with one committed UPDATE ... RETURNING
+    and then allocates from memory, so no per-row uniqueness query is
+    needed and concurrent importers get disjoint blocks. Unused values of a
+    block are simply skipped. Needs an app context when a block runs out.
+    """
+
+    def __init__(self, name='placeholder_serial', prefix='SN-', block_size=1000):
+        self.name = name
+        self.prefix = prefix
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def _reserve_block(self):
+        table = SerialCounter.__table__
+        # Own transaction, so the reservation survives a rolled-back import batch
+        with db.engine.begin() as connection:
+            end = connection.execute(
+                update(table)
+                .where(table.c.name == self.name)
+                .values(next_value=table.c.next_value + self.block_size)
+                .returning(table.c.next_value)
+            ).scalar()
+        if end is None:
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(insert(table).values(name=self.name, next_value=1 + self.block_size))
+                end = 1 + self.block_size
+            except IntegrityError:
+                # Another process created the counter first; take a block from it instead
+                return self._reserve_block()
+        self._next, self._end = end - self.block_size, end
+
+    def allocate(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._reserve_block()
+            value = self._next
+            self._next += 1
+        # Ten digits keeps these apart from the legacy SN-<epoch milliseconds> placeholders
+        return f"{self.prefix}{value:010d}"
+
+
+placeholder_serials = SerialAllocator()
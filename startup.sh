@@ -3,5 +3,9 @@
 # Apply database migrations
 flask db upgrade
 
-# Start Gunicorn server
-gunicorn --bind=0.0.0.0:8000 --timeout 120 app:app
+# Run background jobs (imports, exports, dashboard refresh) in a process of their own, with
+# the pool gunicorn.conf.py budgets for it: two connections per job thread, plus two
+DB_POOL_SIZE=$(( ${JOBS_WORKERS:-1} * 2 + 2 )) DB_MAX_OVERFLOW=0 flask run-jobs &
+
+# Start Gunicorn server (workers, threads and pool sizes: see gunicorn.conf.py)
+gunicorn --config gunicorn.conf.py app:app
@@ -0,0 +1,37 @@
+import io
+import os
+import tempfile
+
+# The app reads its configuration at import time
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['AUDIT_SINK'] = 'sync'
+os.environ['JOBS_IN_WEB'] = '0'
+
+from app import app  # noqa: E402
+from import_inventory import import_rows  # noqa: E402
+from import_parser import IMPORT_COLUMNS  # noqa: E402
+from models import db, Inventory  # noqa: E402
+
+
+def csv_file(*rows):
+    lines = [','.join(IMPORT_COLUMNS)]
+    for tag, date_assigned in rows:
+        values = dict.fromkeys(IMPORT_COLUMNS, '')
+        values.update(site_name='Main', asset_tag=tag, asset_type='Laptop', date_assigned=date_assigned)
+        lines.append(','.join(values[column] for column in IMPORT_COLUMNS))
+    return io.StringIO('\n'.join(lines) + '\n', newline='')
+
+
+def test_rejected_row_is_not_decommissioned():
+    with app.app_context():
+        db.create_all()
+        import_rows(csv_file(('A1', '2024-01-02'), ('A2', '2024-01-02')))
+
+        # A2's row is rejected for its date, but the asset is still in the source
+        stats = import_rows(csv_file(('A1', '2024-01-02'), ('A2', '2024-13-45')), decommission=True)
+
+        assert stats.rejected == 1
+        assert stats.decommissioned == 0
+        a2 = Inventory.query.filter_by(asset_tag='A2').one()
+        assert a2.date_decommissioned is None
+        assert a2.import_hash is not None
@@ -0,0 +1,49 @@
+from flask import current_app
+from sqlalchemy.orm import make_transient_to_detached
+
+from caching import TTLCache
+from models import db, User
+
+# Column values of recently seen users, keyed by id; sized and timed from config on first use
+_cache = TTLCache(maxsize=1024, ttl=30)
+_configured = False
+
+
+def _configure():
+    global _configured
+    if not _configured:
+        _cache.maxsize = current_app.config.get('USER_CACHE_SIZE', _cache.maxsize)
+        _cache.ttl = current_app.config.get('USER_CACHE_TTL', _cache.ttl)
+        _configured = True
+
+
+def load_cached_user(user_id):
+    """Returns the User for a session's user id, hitting the database only on a cache miss.
+
+    The cache holds plain column values, never ORM instances, so each
+    request gets its own User attached to its own session without a query.
+    """
+    _configure()
+    values = _cache.get(user_id)
+    if values is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        _cache.set(user_id, {column.key: getattr(user, column.key) for column in User.__table__.columns})
+        return user
+
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def invalidate_user(user_id):
+    """Forgets a cached user; call after changing or deleting it.
+
+    Other workers drop their copy when USER_CACHE_TTL runs out.
+    """
+    _cache.pop(user_id)
+
+
+def user_cache_stats():
+    return _cache.stats()